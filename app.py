@@ -6,13 +6,22 @@ import webbrowser
 import sys
 import threading
 import time
+import re
+import uuid
+import bisect
+import contextvars
+import sqlite3
+import logging
+import queue
+import atexit
+from collections import deque
 from typing import List, Dict, Optional, Any
 from pathlib import Path
 import json as standard_json
 import winreg
 import shutil
 from flask import Flask, render_template, request, jsonify, send_from_directory
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 
 import tkinter as tk
 from tkinter import ttk
@@ -57,7 +66,9 @@ project_root = Path.cwd()
 sys.path.insert(0, str(project_root))
 
 try:
-    from backend import CaiBackend, DEFAULT_CONFIG
+    from backend import CaiBackend, DEFAULT_CONFIG, SEARCH_CACHE, LOCAL_APP_INDEX_FILENAME, import_local_app_index
+    from backend import SHARED_HTTP_CLIENT, CREATED_FILES, JOB_STEP_RECORDER, JOB_COMPLETED_STEPS, LOG_JOB_ID, new_shared_http_client
+    from backend import MANAGER_NAME_CACHE, DEPOTCACHE_GC_MIN_AGE_HOURS, FILE_LOG_SERVICE
 except ImportError as e:
     print(f"Import Error: {e}")
     sys.exit(1)
@@ -101,28 +112,433 @@ def get_port_from_gui():
 
 # --- Pre-startup Config Check ---
 def should_show_console_on_startup():
+    return read_startup_config_value("show_console_on_startup", False)
+
+def read_startup_config_value(key, default):
     config_path = project_root / 'config.json'
-    if not config_path.exists(): return False
+    if not config_path.exists(): return default
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
-            config = standard_json.load(f)
-        return config.get("show_console_on_startup", False)
+            return standard_json.load(f).get(key, default)
     except Exception as e:
         print(f"启动时读取配置失败: {e}")
-        return False
+        return default
+
+def read_startup_number(key, default, minimum=0, cast=int):
+    """读取数值型配置，类型无效或小于 minimum 时回退为默认值，配置写错也不会导致无法启动。"""
+    value = read_startup_config_value(key, default)
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        print(f"配置项 {key} 的值无效 ({value!r})，使用默认值 {default}。")
+        return default
+    return number if number >= minimum else default
+
+# --- Worker Event Loops ---
+try:
+    import uvloop  # 可选：安装后使用 uvloop 作为工作事件循环
+except ImportError:
+    uvloop = None
+
+class LoopWorker:
+    """常驻的工作事件循环线程，持有一个复用的 HTTP 客户端，通过线程安全队列接收协程。"""
+
+    def __init__(self, index):
+        self.loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        self.client = None
+        self.active = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'cai-loop-{index}', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.client = new_shared_http_client()
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def _run_with_client(self, coro_factory):
+        SHARED_HTTP_CLIENT.set(self.client)
+        return await coro_factory()
+
+    def submit(self, coro_factory):
+        """在本循环上运行 coro_factory() 返回的协程，返回 concurrent.futures.Future。"""
+        with self.lock: self.active += 1
+        future = asyncio.run_coroutine_threadsafe(self._run_with_client(coro_factory), self.loop)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, _future):
+        with self.lock: self.active -= 1
+
+class LoopPool:
+    """固定数量的 LoopWorker，每次提交交给当前负载最小的循环。"""
+
+    def __init__(self, size):
+        self.workers = [LoopWorker(i) for i in range(size)]
+
+    def submit(self, coro_factory):
+        worker = min(self.workers, key=lambda w: w.active)
+        return worker.submit(coro_factory)
+
+    def run(self, coro_factory, timeout=None):
+        """在同步代码中提交协程并等待结果。"""
+        return self.submit(coro_factory).result(timeout)
+
+    async def run_async(self, coro_factory):
+        """在另一个事件循环中（ASGI 模式）提交协程并等待结果，不占用线程。"""
+        return await asyncio.wrap_future(self.submit(coro_factory))
+
+LOOP_POOL = LoopPool(size=read_startup_number("worker_event_loops", 2, minimum=1))
+
+# --- Job Manager & Logging ---
+# 当前协程所属的任务，日志据此归入对应任务
+CURRENT_JOB = contextvars.ContextVar('current_job', default=None)
+
+class JobManager:
+    """管理并发任务：每次提交分配一个任务ID，按任务记录状态与日志，最多同时运行 max_workers 个，
+    其余任务排队等待。任务在 LOOP_POOL 的常驻事件循环上执行，可随时取消或设置时限。"""
+    MAX_PROGRESS = 200
+    MAX_FINISHED_JOBS = 100
+    FINISHED_STATUSES = ("completed", "error", "cancelled", "timeout")
+
+    def __init__(self, max_workers, pool, journal=None):
+        self.max_workers = max_workers
+        self.pool = pool
+        self.journal = journal  # JobJournal，为 None 时不持久化任务
+        self.jobs = {}  # job_id -> job dict，按提交顺序排列
+        self.done_events = {}
+        self.tasks = {}  # job_id -> (事件循环, asyncio.Task)，用于取消运行中的任务
+        self.pending = deque()
+        self.running = 0
+        self.lock = threading.Lock()
+        self.progress_changed = threading.Condition()  # 有新日志或任务结束时通知长轮询
+
+    def submit(self, kind, runner, params, deadline=None, job_id=None, created_at=None):
+        """提交任务。runner(job) 返回协程，其中应把结果写入 job["result"]。
+        deadline 为从开始运行算起的秒数，超时后任务被取消。恢复中断的任务时沿用原来的 job_id。"""
+        job = {
+            "id": job_id or uuid.uuid4().hex[:12], "kind": kind, "params": params,
+            "status": "queued", "progress": deque(maxlen=self.MAX_PROGRESS), "log_seq": 0, "result": None, "deadline": deadline,
+            "cancel_requested": False,
+            "created_at": created_at or time.time(), "started_at": None, "finished_at": None,
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self.done_events[job["id"]] = threading.Event()
+            self._prune()
+            self.pending.append((job, runner))
+        self._journal(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        with self.lock:
+            ready = []
+            while self.pending and self.running < self.max_workers:
+                ready.append(self.pending.popleft())
+                self.running += 1
+        for job, runner in ready:
+            self.pool.submit(lambda job=job, runner=runner: self._run(job, runner))
+
+    def cancel(self, job_id):
+        """请求取消任务。排队中的任务直接移除；运行中的任务在其事件循环上被取消，
+        正在进行的 HTTP 请求、等待与重试会立即中止。返回 False 表示任务已结束。"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in self.FINISHED_STATUSES:
+                return False
+            job["cancel_requested"] = True
+            queued = next((entry for entry in self.pending if entry[0] is job), None)
+            if queued is not None:
+                self.pending.remove(queued)
+                job["status"], job["finished_at"] = "cancelled", time.time()
+                job["result"] = {"success": False, "message": "任务已取消。"}
+                self.done_events[job_id].set()
+                self._journal(job)
+                self._notify_progress()
+                return True
+            loop_and_task = self.tasks.get(job_id)
+        if loop_and_task is not None:
+            loop, task = loop_and_task
+            loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def _journal(self, job):
+        if self.journal is not None:
+            self.journal.record_job(job)
+
+    @staticmethod
+    async def _without_timeout_error(runner, job):
+        """任务内部抛出的 TimeoutError（如网络超时）按普通错误处理，只有 wait_for 的时限到期才算任务超时。"""
+        try:
+            await runner(job)
+        except asyncio.TimeoutError as e:
+            raise RuntimeError(f"操作超时 {e}".strip()) from e
+
+    async def _run(self, job, runner):
+        CURRENT_JOB.set(job)
+        LOG_JOB_ID.set(job["id"])
+        job["status"], job["started_at"] = "running", time.time()
+        # 准备步骤也放在 try 中，出错时同样会释放并发名额
+        try:
+            self._journal(job)
+            if self.journal is not None:
+                JOB_STEP_RECORDER.set(lambda step, detail: self.journal.record_step(job["id"], step, detail))
+                # 恢复的任务据此跳过上次已完成的步骤（批量任务的 app:、已写入的 manifest:）
+                JOB_COMPLETED_STEPS.set(await asyncio.to_thread(self.journal.completed_steps, job["id"]))
+            with self.lock:
+                # 先登记任务再检查取消标记，保证与 cancel() 之间不会漏掉取消请求
+                self.tasks[job["id"]] = (asyncio.get_running_loop(), asyncio.current_task())
+                cancel_requested = job["cancel_requested"]
+            if cancel_requested:
+                raise asyncio.CancelledError()
+            if job["deadline"]:
+                await asyncio.wait_for(self._without_timeout_error(runner, job), timeout=job["deadline"])
+            else:
+                await self._without_timeout_error(runner, job)
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            job["result"] = {"success": False, "message": "任务已取消。"}
+        except asyncio.TimeoutError:
+            job["status"] = "timeout"
+            job["result"] = {"success": False, "message": f"任务超过时限 ({job['deadline']:g} 秒)，已终止。"}
+        except Exception as e:
+            job["status"] = "error"
+            job["result"] = {"success": False, "message": f"发生错误: {str(e)}"}
+            dummy_backend = CaiBackend()
+            patch_log_for_socketio(dummy_backend.log)
+            dummy_backend.log.error(dummy_backend.stack_error(e))
+        finally:
+            if job["status"] == "running":
+                job["status"] = "error"
+                job["result"] = {"success": False, "message": "任务意外终止。"}
+            job["finished_at"] = time.time()
+            self._journal(job)
+            self.done_events[job["id"]].set()
+            self._notify_progress()
+            with self.lock:
+                self.running -= 1
+                self.tasks.pop(job["id"], None)
+            self._dispatch()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in self.FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            del self.done_events[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def latest(self):
+        with self.lock:
+            return next(reversed(self.jobs.values()), None)
+
+    def list(self):
+        with self.lock:
+            return [self.summary(job) for job in self.jobs.values()]
+
+    def wait(self, job_id, timeout):
+        event = self.done_events.get(job_id)
+        return event.wait(timeout) if event else True
+
+    async def wait_async(self, job_id, timeout, interval=0.25):
+        """wait() 的协程版本，轮询完成事件而不阻塞事件循环。"""
+        event = self.done_events.get(job_id)
+        deadline = time.monotonic() + timeout
+        while event is not None and not event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return False
+            await asyncio.sleep(min(interval, remaining))
+        return True
+
+    def wait_for_progress(self, job, since, timeout):
+        """长轮询：等待任务产生序号大于 since 的日志或任务结束，超时返回 False。"""
+        with self.progress_changed:
+            return self.progress_changed.wait_for(
+                lambda: job["log_seq"] > since or job["status"] in self.FINISHED_STATUSES, timeout)
+
+    async def wait_for_progress_async(self, job, since, timeout, interval=0.1):
+        """wait_for_progress() 的协程版本。"""
+        deadline = time.monotonic() + timeout
+        while job["log_seq"] <= since and job["status"] not in self.FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return False
+            await asyncio.sleep(min(interval, remaining))
+        return True
+
+    def progress_since(self, job, since):
+        """序号大于 since 的日志，以及环形缓冲区是否已丢弃了其中一部分。"""
+        with self.progress_changed:
+            progress = list(job["progress"])
+        newer = progress[bisect.bisect_right([entry["seq"] for entry in progress], since):]
+        return newer, bool(progress) and progress[0]["seq"] > since + 1
+
+    def _notify_progress(self):
+        with self.progress_changed:
+            self.progress_changed.notify_all()
+
+    @staticmethod
+    def summary(job):
+        return {key: job[key] for key in ("id", "kind", "params", "status", "result", "deadline", "created_at", "started_at", "finished_at")}
+
+    def add_log(self, job, entry):
+        # progress 为有界环形缓冲区，每条日志带递增的序号，旧日志自动丢弃
+        with self.progress_changed:
+            job["log_seq"] += 1
+            entry["seq"] = job["log_seq"]
+            job["progress"].append(entry)
+            self.progress_changed.notify_all()
+
+class JobJournal:
+    """任务日志：把任务参数、状态以及已完成的步骤（已下载的清单、已写入的 lua / config.vdf）
+    记录到 SQLite。程序被关闭或崩溃后，下次启动时据此恢复未完成的任务并跳过已完成的步骤。
+    写入交给专用线程按顺序执行，任务所在的事件循环不会被磁盘 IO 阻塞；读取前先等待已排队的写入完成。"""
+    MAX_FINISHED_JOBS = 200
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, kind TEXT, params TEXT, deadline REAL, status TEXT,
+            result TEXT, created_at REAL, updated_at REAL)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS steps (
+            job_id TEXT, step TEXT, detail TEXT, recorded_at REAL, PRIMARY KEY (job_id, step))""")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS resume_attempts (job_id TEXT PRIMARY KEY, attempts INTEGER)")
+        self.writes = queue.Queue()
+        threading.Thread(target=self._writer, name='cai-job-journal', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _writer(self):
+        while True:
+            sql, args = self.writes.get()
+            try:
+                with self.lock: self.conn.execute(sql, args)
+            except sqlite3.Error as e:
+                print(f"写入任务日志失败: {e}")
+            finally:
+                self.writes.task_done()
+
+    def flush(self):
+        """等待已排队的写入全部完成。"""
+        self.writes.join()
+
+    def record_job(self, job):
+        row = (job["id"], job["kind"], standard_json.dumps(job["params"], ensure_ascii=False), job["deadline"], job["status"],
+               standard_json.dumps(job["result"], ensure_ascii=False), job["created_at"], time.time())
+        self.writes.put(("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row))
+
+    def record_step(self, job_id, step, detail=""):
+        self.writes.put(("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)", (job_id, step, detail, time.time())))
+
+    def completed_steps(self, job_id):
+        self.flush()
+        with self.lock:
+            return dict(self.conn.execute("SELECT step, detail FROM steps WHERE job_id = ?", (job_id,)).fetchall())
+
+    def bump_resume_attempts(self, job_id):
+        """记录一次恢复尝试，返回包括本次在内的尝试次数。"""
+        self.flush()
+        with self.lock:
+            self.conn.execute("INSERT INTO resume_attempts VALUES (?, 1) "
+                              "ON CONFLICT(job_id) DO UPDATE SET attempts = attempts + 1", (job_id,))
+            return self.conn.execute("SELECT attempts FROM resume_attempts WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def abandon(self, job_id, message):
+        """将多次恢复仍未完成的任务标记为失败，下次启动不再恢复。"""
+        result = standard_json.dumps({"success": False, "message": message}, ensure_ascii=False)
+        self.writes.put(("UPDATE jobs SET status = 'error', result = ?, updated_at = ? WHERE id = ?", (result, time.time(), job_id)))
+
+    def interrupted_jobs(self):
+        """上次运行结束时仍在排队或运行中的任务。"""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, kind, params, deadline, created_at FROM jobs "
+                "WHERE status IN ('queued', 'running') ORDER BY created_at").fetchall()
+        return [{"id": row[0], "kind": row[1], "params": standard_json.loads(row[2]), "deadline": row[3], "created_at": row[4]}
+                for row in rows]
+
+    def prune(self):
+        self.writes.put(("DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+                         "(SELECT id FROM jobs ORDER BY updated_at DESC LIMIT ?)", (self.MAX_FINISHED_JOBS,)))
+        self.writes.put(("DELETE FROM steps WHERE job_id NOT IN (SELECT id FROM jobs)", ()))
+        self.writes.put(("DELETE FROM resume_attempts WHERE job_id NOT IN (SELECT id FROM jobs)", ()))
+
+JOURNAL = JobJournal(project_root / 'userdata' / 'jobs.db') if read_startup_config_value("job_journal", True) else None
+JOBS = JobManager(max_workers=read_startup_number("max_concurrent_jobs", 3, minimum=1), pool=LOOP_POOL, journal=JOURNAL)
+
+# 推送事件的出口：默认使用 Flask-SocketIO，ASGI 模式下由 asgi_server 替换为异步 Socket.IO 服务器
+_event_emitter = None
+
+def set_event_emitter(emitter):
+    global _event_emitter
+    _event_emitter = emitter
+
+def emit_event(event, data, to=None):
+    if _event_emitter is not None: _event_emitter(event, data, to=to)
+    else: socketio.emit(event, data, to=to)
+
+class LogEmitPipeline:
+    """日志推送攒批：日志行只追加到有界缓冲区，后台线程每 FLUSH_INTERVAL 秒或攒够 FLUSH_BATCH 行时
+    一次性发送 task_progress_batch 事件，下载循环不再被逐行同步 emit 拖慢。
+    任务日志只发往以任务ID命名的房间，不属于任何任务的日志仍然广播。"""
+    FLUSH_INTERVAL = 0.1
+    FLUSH_BATCH = 50
+    MAX_PENDING = 2000  # 客户端跟不上时丢弃最旧的行，任务自身的 progress 缓冲仍可通过接口补取
+
+    def __init__(self):
+        self.pending = deque(maxlen=self.MAX_PENDING)
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='cai-log-flusher', daemon=True)
+        self.thread.start()
+
+    def push(self, entry):
+        self.pending.append(entry)
+        if len(self.pending) >= self.FLUSH_BATCH: self.wake.set()
 
-# --- Global Task State & Logging ---
-TASK_STATE = {"status": "idle", "progress": [], "result": None}
+    def _run(self):
+        while True:
+            self.wake.wait(self.FLUSH_INTERVAL)
+            self.wake.clear()
+            try: self.flush()
+            except Exception as e: print(f"推送日志失败: {e}")
+
+    def flush(self):
+        batch = []
+        while self.pending:
+            try: batch.append(self.pending.popleft())
+            except IndexError: break
+        by_room = {}
+        for entry in batch:
+            by_room.setdefault(entry.get("job_id"), []).append(entry)
+        for room, entries in by_room.items():
+            emit_event('task_progress_batch', {"entries": entries}, to=room)
+
+LOG_PIPELINE = LogEmitPipeline()
+LOG_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
 
 def patch_log_for_socketio(logger):
     if hasattr(logger, '_is_patched_by_web'): return
     def create_handler(original_func, log_type):
+        level = LOG_LEVELS[log_type]
         def handler(msg, *args, **kwargs):
+            # 级别未开启（例如关闭调试模式时的 debug 日志）直接丢弃，不格式化也不推送
+            if not logger.isEnabledFor(level): return
             try: full_msg = msg % args if args else msg
             except TypeError: full_msg = str(msg)
-            if len(TASK_STATE["progress"]) > 200: TASK_STATE["progress"].pop(0)
-            TASK_STATE["progress"].append({"type": log_type, "message": full_msg})
-            socketio.emit('task_progress', {"type": log_type, "message": full_msg})
+            entry = {"type": log_type, "message": full_msg}
+            job = CURRENT_JOB.get()
+            if job is not None:
+                entry["job_id"] = job["id"]
+                JOBS.add_log(job, entry)
+            LOG_PIPELINE.push(entry)
             return original_func(full_msg)
         return handler
     original_info, original_warning, original_error, original_debug = logger.info, logger.warning, logger.error, logger.debug
@@ -146,23 +562,24 @@ def manager_page():
 
 
 # --- Core API Routes ---
+# 以下 _xxx_payload 协程由 Flask 路由与 ASGI 路由（asgi_server.py）共用
+async def _initialize_payload():
+    async with CaiBackend() as backend:
+        patch_log_for_socketio(backend.log)
+        unlocker_type = await backend.initialize()
+        if backend.config is None:
+            return {"success": False, "message": "加载配置失败，请检查日志。"}
+        return {
+            "success": True,
+            "unlocker_type": unlocker_type,
+            "steam_path": str(backend.steam_path) if backend.steam_path else "Not Found",
+            "has_token": bool(backend.config.get("Github_Personal_Token", "").strip())
+        }
+
 @app.route('/api/initialize', methods=['POST'])
 def initialize_app():  # 改为同步函数
     try:
-        async def _init():
-            async with CaiBackend() as backend:
-                patch_log_for_socketio(backend.log)
-                unlocker_type = await backend.initialize()
-                if backend.config is None:
-                    return {"success": False, "message": "加载配置失败，请检查日志。"}
-                return {
-                    "success": True,
-                    "unlocker_type": unlocker_type,
-                    "steam_path": str(backend.steam_path) if backend.steam_path else "Not Found",
-                    "has_token": bool(backend.config.get("Github_Personal_Token", "").strip())
-                }
-        
-        result = asyncio.run(_init())
+        result = asyncio.run(_initialize_payload())
         return jsonify(result)
         
     except Exception as e:
@@ -172,21 +589,21 @@ def initialize_app():  # 改为同步函数
         return jsonify({"success": False, "message": message})
 
 # NEW: Auto-update check endpoint
+async def _check_updates_payload():
+    async with CaiBackend() as backend:
+        patch_log_for_socketio(backend.log)
+        await backend.initialize()
+        has_update, update_info = await backend.check_for_updates()
+        return {
+            "success": True,
+            "has_update": has_update,
+            "update_info": update_info
+        }
+
 @app.route('/api/check_updates', methods=['POST'])
 def check_updates():  # 改为同步函数
     try:
-        async def _check():
-            async with CaiBackend() as backend:
-                patch_log_for_socketio(backend.log)
-                await backend.initialize()
-                has_update, update_info = await backend.check_for_updates()
-                return {
-                    "success": True,
-                    "has_update": has_update,
-                    "update_info": update_info
-                }
-        
-        result = asyncio.run(_check())
+        result = asyncio.run(_check_updates_payload())
         return jsonify(result)
         
     except Exception as e:
@@ -196,48 +613,49 @@ def check_updates():  # 改为同步函数
         return jsonify({"success": False, "message": message})
 
 # NEW: Get available sources (including custom repos)
+async def _sources_payload():
+    async with CaiBackend() as backend:
+        await backend.initialize()
+        
+        # Built-in sources
+        builtin_sources = {
+            "自动搜索GitHub": "search",
+            "自动选择最佳源": "auto",
+            "SWA V2": "printedwaste", 
+            "Cysaw": "cysaw",
+            "Furcate": "furcate",
+            "Walftech": "walftech",
+            "steamdatabase": "steamdatabase",
+            "SteamAutoCracks/ManifestHub(2) （仅密钥）": "steamautocracks_v2",
+            "Sudama库(仅密钥）": "sudama",
+            "清单不求人库（仅清单）": "buqiuren", 
+            "GitHub (Auiowu)": "Auiowu/ManifestAutoUpdate",
+            "GitHub (SAC)": "SteamAutoCracks/ManifestHub"
+        }
+        
+        # Custom sources
+        custom_github_repos = backend.get_custom_github_repos()
+        custom_zip_repos = backend.get_custom_zip_repos()
+        
+        # Add custom GitHub repos
+        for repo in custom_github_repos:
+            builtin_sources[f"{repo['name']} (自定义GitHub)"] = repo['repo']
+        
+        # Add custom ZIP repos  
+        for repo in custom_zip_repos:
+            builtin_sources[f"{repo['name']} (自定义ZIP)"] = f"custom_zip_{repo['name']}"
+        
+        return {
+            "success": True,
+            "sources": builtin_sources,
+            "custom_github_count": len(custom_github_repos),
+            "custom_zip_count": len(custom_zip_repos)
+        }
+
 @app.route('/api/sources', methods=['GET'])
 def get_sources():  # 改为同步函数
     try:
-        async def _get_sources():
-            async with CaiBackend() as backend:
-                await backend.initialize()
-                
-                # Built-in sources
-                builtin_sources = {
-                    "自动搜索GitHub": "search",
-                    "SWA V2": "printedwaste", 
-                    "Cysaw": "cysaw",
-                    "Furcate": "furcate",
-                    "Walftech": "walftech",
-                    "steamdatabase": "steamdatabase",
-                    "SteamAutoCracks/ManifestHub(2) （仅密钥）": "steamautocracks_v2",
-                    "Sudama库(仅密钥）": "sudama",
-                    "清单不求人库（仅清单）": "buqiuren", 
-                    "GitHub (Auiowu)": "Auiowu/ManifestAutoUpdate",
-                    "GitHub (SAC)": "SteamAutoCracks/ManifestHub"
-                }
-                
-                # Custom sources
-                custom_github_repos = backend.get_custom_github_repos()
-                custom_zip_repos = backend.get_custom_zip_repos()
-                
-                # Add custom GitHub repos
-                for repo in custom_github_repos:
-                    builtin_sources[f"{repo['name']} (自定义GitHub)"] = repo['repo']
-                
-                # Add custom ZIP repos  
-                for repo in custom_zip_repos:
-                    builtin_sources[f"{repo['name']} (自定义ZIP)"] = f"custom_zip_{repo['name']}"
-                
-                return {
-                    "success": True,
-                    "sources": builtin_sources,
-                    "custom_github_count": len(custom_github_repos),
-                    "custom_zip_count": len(custom_zip_repos)
-                }
-        
-        result = asyncio.run(_get_sources())
+        result = asyncio.run(_sources_payload())
         return jsonify(result)
         
     except Exception as e:
@@ -246,10 +664,37 @@ def get_sources():  # 改为同步函数
         dummy_backend.log.error(dummy_backend.stack_error(e))
         return jsonify({"success": False, "message": message})
 
-async def _run_search_game_task(game_name):
+async def _probe_sources_payload(app_id_input, use_cache=True):
+    async with CaiBackend() as backend:
+        backend.config = await backend.load_config()  # 只需要自定义 ZIP 仓库配置
+        app_id = backend.extract_app_id(app_id_input)
+        if not app_id:
+            return {"success": False, "message": f"无法从 '{app_id_input}' 中提取有效AppID。"}
+        sources = await backend.probe_zip_sources(app_id, use_cache=use_cache)
+        return {"success": True, "app_id": app_id, "sources": sources,
+                "available": [source["source"] for source in sources if source["available"]]}
+
+@app.route('/api/sources/probe', methods=['GET'])
+def probe_sources():
+    app_id_input = request.args.get('app_id', '').strip()
+    if not app_id_input:
+        return jsonify({"success": False, "message": "请输入 AppID 或链接。"}), 400
+    try:
+        result = asyncio.run(_probe_sources_payload(app_id_input, use_cache=not _parse_bool(request.args.get('refresh', False))))
+        return jsonify(result)
+    except Exception as e:
+        dummy_backend = CaiBackend()
+        message = f"探测清单源失败: {str(e)}"
+        dummy_backend.log.error(dummy_backend.stack_error(e))
+        return jsonify({"success": False, "message": message})
+
+async def _run_search_game_task(game_name, is_stale=None):
+    """is_stale 在请求上游前调用，返回 True 时放弃搜索并返回 None（联想输入已被更新的输入取代）。"""
     async with CaiBackend() as backend:
         patch_log_for_socketio(backend.log)
         await backend.initialize()
+        if is_stale is not None and is_stale():
+            return None
         results = await backend.find_appid_by_name(game_name)
         return results
 
@@ -268,21 +713,93 @@ def search_game():
         dummy_backend.log.error(dummy_backend.stack_error(e))
         return jsonify({"success": False, "message": message}), 500
 
-async def _run_unlock_task(app_id, tool_type, use_st_auto_update, add_all_dlc, patch_depot_key):
+# --- Typeahead search ---
+TYPEAHEAD_DEBOUNCE_SECONDS = 0.25
+TYPEAHEAD_LATEST = {}  # client_id -> 最新一次输入的序号
+TYPEAHEAD_LOCK = threading.Lock()
+TYPEAHEAD_INPUT = threading.Condition(TYPEAHEAD_LOCK)  # 有新输入时唤醒正在去抖的旧请求
+TYPEAHEAD_WARMING = set()  # 正在后台补全的查询，避免重复请求上游
+
+def _is_stale_typeahead(client_id, seq):
+    with TYPEAHEAD_LOCK:
+        return TYPEAHEAD_LATEST.get(client_id, seq) > seq
+
+def _warm_search_cache(game_name):
+    key = SEARCH_CACHE.normalize(game_name)
+    with TYPEAHEAD_LOCK:
+        if key in TYPEAHEAD_WARMING: return
+        TYPEAHEAD_WARMING.add(key)
+    def _on_done(future):
+        with TYPEAHEAD_LOCK: TYPEAHEAD_WARMING.discard(key)
+        if future.exception():
+            dummy_backend = CaiBackend()
+            dummy_backend.log.error(dummy_backend.stack_error(future.exception()))
+    LOOP_POOL.submit(lambda: _run_search_game_task(game_name)).add_done_callback(_on_done)
+
+def _typeahead_before_debounce(game_name, client_id, seq):
+    """记录最新序号并查询缓存，命中时返回可直接响应的结果。"""
+    if not game_name:
+        return {"success": True, "games": [], "seq": seq}
+    with TYPEAHEAD_LOCK:
+        if seq >= TYPEAHEAD_LATEST.get(client_id, 0):
+            TYPEAHEAD_LATEST[client_id] = seq
+            TYPEAHEAD_INPUT.notify_all()
+    cached = SEARCH_CACHE.get(game_name)
+    if cached is not None:
+        return {"success": True, "games": cached, "seq": seq, "partial": False}
+    return None
+
+def _wait_typeahead_debounce(client_id, seq):
+    """同步模式的去抖：最多等待 TYPEAHEAD_DEBOUNCE_SECONDS，被更新的输入取代时立即返回，不会白白占住工作线程。"""
+    with TYPEAHEAD_INPUT:
+        TYPEAHEAD_INPUT.wait_for(lambda: TYPEAHEAD_LATEST.get(client_id, seq) > seq, timeout=TYPEAHEAD_DEBOUNCE_SECONDS)
+
+def _typeahead_after_debounce(game_name, client_id, seq):
+    """去抖结束后：已过期则丢弃；已缓存的前缀可以立即给出过滤后的结果，同时在后台补全完整结果。"""
+    if _is_stale_typeahead(client_id, seq):
+        return {"success": True, "stale": True, "seq": seq}
+    prefix_results = SEARCH_CACHE.get_by_prefix(game_name)
+    if prefix_results:
+        _warm_search_cache(game_name)
+        return {"success": True, "games": prefix_results, "seq": seq, "partial": True}
+    return None
+
+@app.route('/api/search_game/typeahead', methods=['GET'])
+def search_game_typeahead():
+    game_name = request.args.get('q', '').strip()
+    client_id = request.args.get('client_id', request.remote_addr)
+    seq = request.args.get('seq', 0, type=int)
+    early = _typeahead_before_debounce(game_name, client_id, seq)
+    if early is not None:
+        return jsonify(early)
+
+    _wait_typeahead_debounce(client_id, seq)
+    early = _typeahead_after_debounce(game_name, client_id, seq)
+    if early is not None:
+        return jsonify(early)
+
+    try:
+        # 初始化后、请求上游前再检查一次，已被取代的输入不再消耗上游请求
+        results = asyncio.run(_run_search_game_task(game_name, lambda: _is_stale_typeahead(client_id, seq)))
+    except Exception as e:
+        dummy_backend = CaiBackend()
+        message = f"搜索时发生错误: {e}"
+        dummy_backend.log.error(dummy_backend.stack_error(e))
+        return jsonify({"success": False, "message": message, "seq": seq}), 500
+    if results is None or _is_stale_typeahead(client_id, seq):
+        return jsonify({"success": True, "stale": True, "seq": seq})
+    return jsonify({"success": True, "games": results, "seq": seq, "partial": False})
+
+async def _run_unlock_task(job, app_id, tool_type, use_st_auto_update, add_all_dlc, patch_depot_key):
     async with CaiBackend() as backend:
         patch_log_for_socketio(backend.log)
-        TASK_STATE["status"] = "running"
-        TASK_STATE["progress"] = []
-        TASK_STATE["result"] = None
         unlocker_type = await backend.initialize()
         if not unlocker_type:
             raise Exception("解锁工具类型未能确定，请检查配置或Steam路径。")
 
         await backend.checkcn()
-        if tool_type == "search" or "github" in tool_type.lower() or 'auiowu' in tool_type.lower() or 'steamautocracks' in tool_type.lower():
-            # 注意：这里需要排除steamautocracks_v2，因为它不是GitHub仓库
-            if tool_type != "steamautocracks_v2" and not await backend.check_github_api_rate_limit():
-                raise Exception("GitHub API 请求次数已用尽，无法继续。")
+        if backend.uses_github_api(tool_type) and not await backend.check_github_api_rate_limit():
+            raise Exception("GitHub API 请求次数已用尽，无法继续。")
                 
         app_id_extracted = backend.extract_app_id(app_id)
         if not app_id_extracted:
@@ -294,7 +811,7 @@ async def _run_unlock_task(app_id, tool_type, use_st_auto_update, add_all_dlc, p
             results = await backend.search_all_repos_for_appid(app_id_extracted)
             if not results:
                 raise Exception(f"在所有 GitHub 仓库中都未找到 AppID {app_id_extracted} 的清单。")
-            TASK_STATE["result"] = {
+            job["result"] = {
                 "success": True, "message": "搜索完成，请选择一个清单源。", "action_required": "select_source",
                 "sources": results, "context": {"use_st_auto_update": use_st_auto_update, "add_all_dlc": add_all_dlc, "patch_depot_key": patch_depot_key}
             }
@@ -302,30 +819,82 @@ async def _run_unlock_task(app_id, tool_type, use_st_auto_update, add_all_dlc, p
             return
             
         backend.log.info(f"--- 正在使用源 '{tool_type}' 处理 AppID: {app_id_extracted} ---")
-        
-        # 修改这里：添加steamautocracks_v2到zip_sources列表
-        zip_sources = ["printedwaste", "cysaw", "furcate", "walftech", "steamdatabase", "steamautocracks_v2", "sudama"]
-        
-        # Check for custom zip sources
-        if tool_type.startswith("custom_zip_"):
-            success = await backend.process_zip_source(app_id_extracted, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
-        elif tool_type in zip_sources:
-            success = await backend.process_zip_source(app_id_extracted, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
-        else:
-            success = await backend.process_github_manifest(app_id_extracted, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
+        success = await backend.process_app(app_id_extracted, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
         
         if success:
-            TASK_STATE["result"] = {"success": True, "message": f"成功配置 AppID {app_id_extracted}。重启 Steam 后生效。"}
+            job["result"] = {"success": True, "message": f"成功配置 AppID {app_id_extracted}。重启 Steam 后生效。"}
         else:
             raise Exception(f"处理 AppID {app_id_extracted} 失败，请检查日志。")
 
+# Batch unlock runner
+BATCH_MAX_PARALLELISM = 16
+
+async def _run_batch_unlock_task(job, app_ids, tool_type, use_st_auto_update, add_all_dlc, patch_depot_key, parallelism):
+    """批量入库：只初始化一次，共享 HTTP 客户端与缓存，按并发上限处理所有 AppID。"""
+    async with CaiBackend() as backend:
+        patch_log_for_socketio(backend.log)
+        unlocker_type = await backend.initialize()
+        if not unlocker_type:
+            raise Exception("解锁工具类型未能确定，请检查配置或Steam路径。")
+
+        await backend.checkcn()
+        if backend.uses_github_api(tool_type) and not await backend.check_github_api_rate_limit():
+            raise Exception("GitHub API 请求次数已用尽，无法继续。")
+
+        total = len(app_ids)
+        # 恢复中断的批量任务时，任务日志中已成功的 AppID 直接沿用之前的结果
+        done_steps = JOB_COMPLETED_STEPS.get() or {}
+        items = [standard_json.loads(detail) for step, detail in done_steps.items() if step.startswith("app:")]
+        finished_ids = {item["app_id"] for item in items}
+        if finished_ids:
+            backend.log.info(f"从任务日志恢复: {len(finished_ids)}/{total} 个 AppID 已完成，将跳过。")
+        job["result"] = {"success": None, "message": f"批量入库进行中: {len(items)}/{total}", "items": items}
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def _process_one(app_id):
+            async with semaphore:
+                started = time.time()
+                source = tool_type
+                created_files = []
+                CREATED_FILES.set(created_files)
+                try:
+                    if tool_type == "search":
+                        # 批量模式无法逐个让用户选择，自动使用最近更新的仓库
+                        results = await backend.search_all_repos_for_appid(app_id)
+                        if not results:
+                            raise Exception("在所有 GitHub 仓库中都未找到清单。")
+                        source = max(results, key=lambda r: r['update_date'])['repo']
+                    backend.log.info(f"--- [批量] 正在使用源 '{source}' 处理 AppID: {app_id} ---")
+                    success = await backend.process_app(app_id, source, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
+                    message = "成功" if success else "处理失败，请检查日志。"
+                except asyncio.CancelledError:
+                    # 只清理尚未完成的 AppID，已成功入库的保留
+                    backend.discard_created_files(created_files)
+                    raise
+                except Exception as e:
+                    success, message = False, str(e)
+                item = {"app_id": app_id, "source": source, "success": success, "message": message,
+                        "duration": round(time.time() - started, 2)}
+                items.append(item)
+                if success and JOURNAL:
+                    JOURNAL.record_step(job["id"], f"app:{app_id}", standard_json.dumps(item, ensure_ascii=False))
+                job["result"]["message"] = f"批量入库进行中: {len(items)}/{total}"
+
+        await asyncio.gather(*(_process_one(app_id) for app_id in app_ids if app_id not in finished_ids))
+
+        succeeded = sum(1 for item in items if item["success"])
+        backend.log.info(f"批量入库完成: 成功 {succeeded}/{total}")
+        job["result"] = {
+            "success": succeeded == total,
+            "message": f"批量入库完成: 成功 {succeeded}/{total}。重启 Steam 后生效。",
+            "succeeded": succeeded, "failed": total - succeeded,
+            "items": sorted(items, key=lambda item: app_ids.index(item["app_id"])),
+        }
+
 # Workshop task runner
-async def _run_workshop_task(workshop_input, copy_to_config, copy_to_depot):
+async def _run_workshop_task(job, workshop_input, copy_to_config, copy_to_depot):
     async with CaiBackend() as backend:
         patch_log_for_socketio(backend.log)
-        TASK_STATE["status"] = "running"
-        TASK_STATE["progress"] = []
-        TASK_STATE["result"] = None
         
         unlocker_type = await backend.initialize()
         if not unlocker_type:
@@ -336,14 +905,12 @@ async def _run_workshop_task(workshop_input, copy_to_config, copy_to_depot):
         success = await backend.process_workshop_item(workshop_input, copy_to_config, copy_to_depot)
         
         if success:
-            TASK_STATE["result"] = {"success": True, "message": f"成功处理创意工坊物品。重启 Steam 后生效。"}
+            job["result"] = {"success": True, "message": f"成功处理创意工坊物品。重启 Steam 后生效。"}
         else:
             raise Exception(f"处理创意工坊物品失败，请检查日志。")
 
 @app.route('/api/start_task', methods=['POST'])
 def start_task():
-    if TASK_STATE["status"] == "running":
-        return jsonify({"success": False, "message": "一个任务正在运行中。"})
     data = request.get_json()
     app_id_input = data.get('app_id', '').strip()
     tool_type = data.get('tool_type', 'search')
@@ -353,34 +920,66 @@ def start_task():
     
     if not app_id_input:
         return jsonify({"success": False, "message": "请输入 AppID 或链接。"})
-    def task_wrapper():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(_run_unlock_task(app_id_input, tool_type, use_st_auto_update, add_all_dlc, patch_depot_key))
-            TASK_STATE["status"] = "completed"
-        except Exception as e:
-            TASK_STATE["status"] = "error"
-            message = f"发生错误: {str(e)}"
-            TASK_STATE["result"] = {"success": False, "message": message}
-            dummy_backend = CaiBackend()
-            patch_log_for_socketio(dummy_backend.log)
-            dummy_backend.log.error(dummy_backend.stack_error(e))
-        finally:
-            if TASK_STATE["status"] == "running":
-                TASK_STATE["status"] = "error"
-                TASK_STATE["result"] = {"success": False, "message": "任务意外终止。"}
-            loop.close()
-    thread = threading.Thread(target=task_wrapper, daemon=True)
-    thread.start()
-    return jsonify({"success": True, "message": "任务已开始。"})
+    # params 保存完整的任务参数，任务被中断后据此在下次启动时恢复
+    params = {"app_id": app_id_input, "tool_type": tool_type, "use_st_auto_update": use_st_auto_update,
+              "add_all_dlc": add_all_dlc, "patch_depot_key": patch_depot_key}
+    job = JOBS.submit("unlock", lambda job: _run_unlock_task(job, **params), params,
+                      deadline=_parse_deadline(data.get('deadline')))
+    return jsonify({"success": True, "message": "任务已开始。", "job_id": job["id"]})
+
+def _parse_bool(value):
+    if isinstance(value, bool): return value
+    return str(value).strip().lower() in ("1", "true", "on", "yes")
+
+def _parse_deadline(value):
+    """任务时限（秒），未填写或无效时返回 None 表示不限时。"""
+    try:
+        deadline = float(value)
+    except (TypeError, ValueError):
+        return None
+    return deadline if deadline > 0 else None
+
+@app.route('/api/batch/start_task', methods=['POST'])
+def start_batch_task():
+    # 支持 JSON 请求体，或上传包含 AppID/链接列表的文本文件 (multipart 字段 appListFile)
+    if request.files.get('appListFile'):
+        data = request.form
+        raw_ids = request.files['appListFile'].read().decode('utf-8', errors='ignore')
+    else:
+        data = request.get_json() or {}
+        raw_ids = data.get('app_ids', [])
+    if isinstance(raw_ids, str):
+        raw_ids = re.split(r'[\s,;]+', raw_ids)
+
+    parser = CaiBackend()
+    app_ids, invalid = [], []
+    for token in (str(t).strip() for t in raw_ids):
+        if not token: continue
+        app_id = parser.extract_app_id(token)
+        if not app_id: invalid.append(token)
+        elif app_id not in app_ids: app_ids.append(app_id)
+    if not app_ids:
+        return jsonify({"success": False, "message": "未找到任何有效的 AppID。", "invalid": invalid}), 400
+
+    tool_type = data.get('tool_type', 'search')
+    use_st_auto_update = _parse_bool(data.get('use_st_auto_update', False))
+    add_all_dlc = _parse_bool(data.get('add_all_dlc', False))
+    patch_depot_key = _parse_bool(data.get('patch_depot_key', False))
+    try:
+        parallelism = min(max(int(data.get('parallelism', 4)), 1), BATCH_MAX_PARALLELISM)
+    except (TypeError, ValueError):
+        parallelism = 4
+
+    params = {"app_ids": app_ids, "tool_type": tool_type, "use_st_auto_update": use_st_auto_update,
+              "add_all_dlc": add_all_dlc, "patch_depot_key": patch_depot_key, "parallelism": parallelism}
+    job = JOBS.submit("batch", lambda job: _run_batch_unlock_task(job, **params), params,
+                      deadline=_parse_deadline(data.get('deadline')))
+    return jsonify({"success": True, "message": f"批量任务已开始，共 {len(app_ids)} 个 AppID。", "job_id": job["id"],
+                    "app_ids": app_ids, "invalid": invalid})
 
 # Workshop task endpoint
 @app.route('/api/workshop/start_task', methods=['POST'])
 def start_workshop_task():
-    if TASK_STATE["status"] == "running":
-        return jsonify({"success": False, "message": "一个任务正在运行中。"})
-    
     data = request.get_json()
     workshop_input = data.get('workshop_input', '').strip()
     copy_to_config = data.get('copy_to_config', True)
@@ -392,45 +991,490 @@ def start_workshop_task():
     if not copy_to_config and not copy_to_depot:
         return jsonify({"success": False, "message": "请至少选择一个目标目录。"})
     
-    def task_wrapper():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    params = {"workshop_input": workshop_input, "copy_to_config": copy_to_config, "copy_to_depot": copy_to_depot}
+    job = JOBS.submit("workshop", lambda job: _run_workshop_task(job, **params), params,
+                      deadline=_parse_deadline(data.get('deadline')))
+    return jsonify({"success": True, "message": "创意工坊任务已开始。", "job_id": job["id"]})
+
+# 任务类型 -> 任务函数，参数与提交时保存的 params 一致
+async def _run_refresh_task(job, apps, parallelism):
+    """自动刷新：只更新清单有变化的 depot，不重新入库，用户原有的解锁选项保持不变。"""
+    async with CaiBackend() as backend:
+        patch_log_for_socketio(backend.log)
+        if not await backend.initialize():
+            raise Exception("解锁工具类型未能确定，请检查配置或Steam路径。")
+
+        total = len(apps)
+        done_steps = JOB_COMPLETED_STEPS.get() or {}
+        items = [standard_json.loads(detail) for step, detail in done_steps.items() if step.startswith("app:")]
+        finished_ids = {item["app_id"] for item in items}
+        job["result"] = {"success": None, "message": f"自动刷新进行中: {len(items)}/{total}", "items": items}
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def _refresh_one(entry):
+            async with semaphore:
+                started = time.time()
+                try:
+                    success = await backend.refresh_outdated_app(entry["app_id"], entry["tool"], entry["changed_depots"])
+                    message = "成功" if success else "刷新失败，请检查日志。"
+                except Exception as e:
+                    success, message = False, str(e)
+                item = {"app_id": entry["app_id"], "source": "auto_refresh", "success": success, "message": message,
+                        "duration": round(time.time() - started, 2)}
+                items.append(item)
+                if success and JOURNAL:
+                    JOURNAL.record_step(job["id"], f"app:{entry['app_id']}", standard_json.dumps(item, ensure_ascii=False))
+                job["result"]["message"] = f"自动刷新进行中: {len(items)}/{total}"
+
+        await asyncio.gather(*(_refresh_one(entry) for entry in apps if entry["app_id"] not in finished_ids))
+
+        succeeded = sum(1 for item in items if item["success"])
+        backend.log.info(f"自动刷新完成: 成功 {succeeded}/{total}")
+        job["result"] = {
+            "success": succeeded == total,
+            "message": f"自动刷新完成: 成功 {succeeded}/{total}。重启 Steam 后生效。",
+            "succeeded": succeeded, "failed": total - succeeded, "items": items,
+        }
+
+JOB_RUNNERS = {"unlock": _run_unlock_task, "batch": _run_batch_unlock_task, "workshop": _run_workshop_task, "refresh": _run_refresh_task}
+
+MAX_RESUME_ATTEMPTS = 3
+
+def resume_interrupted_jobs():
+    """启动时重新提交上次被关闭或崩溃打断的任务，已完成的步骤由各任务自行跳过。
+    同一任务最多恢复 MAX_RESUME_ATTEMPTS 次，避免导致崩溃的任务在每次启动时反复执行。"""
+    if JOURNAL is None: return
+    JOURNAL.prune()
+    for record in JOURNAL.interrupted_jobs():
+        runner = JOB_RUNNERS.get(record["kind"])
+        if runner is None: continue
+        attempts = JOURNAL.bump_resume_attempts(record["id"])
+        if attempts > MAX_RESUME_ATTEMPTS:
+            JOURNAL.abandon(record["id"], f"任务已被恢复 {MAX_RESUME_ATTEMPTS} 次仍未完成，已放弃。")
+            print(f"任务 {record['id']} ({record['kind']}) 已恢复 {MAX_RESUME_ATTEMPTS} 次仍未完成，不再自动恢复。")
+            continue
+        JOBS.submit(record["kind"], lambda job, runner=runner, params=record["params"]: runner(job, **params), record["params"],
+                    deadline=record["deadline"], job_id=record["id"], created_at=record["created_at"])
+        print(f"已恢复上次中断的任务: {record['id']} ({record['kind']})")
+
+# --- Auto Refresh ---
+async def _find_outdated_apps_payload(concurrency):
+    async with CaiBackend() as backend:
+        patch_log_for_socketio(backend.log)
+        await backend.initialize()
+        return await backend.find_outdated_apps(concurrency)
+
+class AutoRefreshScheduler:
+    """后台定时检查已入库游戏的上游清单，只为公开清单有变化的游戏提交一个刷新任务（只更新变化的清单，不重新入库）。
+    每轮最多刷新 auto_refresh_max_apps 个游戏，按上次尝试刷新的时间排序，从未刷新过的优先，超出上限的留到下一轮；
+    上一轮的刷新任务未结束时跳过本轮。间隔配置每 CONFIG_RECHECK_SECONDS 秒重新读取一次，在设置中修改后无需重启即可生效；
+    间隔为 0 时只响应手动触发。"""
+    CHECK_TIMEOUT = 30 * 60
+    CONFIG_RECHECK_SECONDS = 60
+
+    def __init__(self, jobs, pool):
+        self.jobs = jobs
+        self.pool = pool
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.state = {"checking": False, "last_run": None, "next_run": None, "last_result": None, "job_id": None}
+        self.last_attempt = {}  # app_id -> 上次提交刷新的时间，用于轮转
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name='cai-auto-refresh', daemon=True)
+            self.thread.start()
+
+    def trigger(self):
+        self.wake.set()
+
+    def status(self):
+        with self.lock:
+            return dict(self.state)
+
+    def _loop(self):
+        last_run = time.time()
+        while True:
+            interval_hours = read_startup_number("auto_refresh_interval_hours", 0, cast=float)
+            if interval_hours > 0:
+                due = last_run + interval_hours * 3600
+            else:
+                # 关闭期间不累计等待时间，重新开启后从开启时起算一个完整间隔
+                due, last_run = None, time.time()
+            with self.lock:
+                self.state["next_run"] = due
+            # 分段等待，期间修改的间隔配置最多 CONFIG_RECHECK_SECONDS 秒后生效
+            wait = self.CONFIG_RECHECK_SECONDS if due is None else min(max(0, due - time.time()), self.CONFIG_RECHECK_SECONDS)
+            triggered = self.wake.wait(wait)
+            self.wake.clear()
+            if triggered or (due is not None and time.time() >= due):
+                self.run_once()
+                last_run = time.time()
+
+    def run_once(self):
+        with self.lock:
+            previous = self.jobs.get(self.state["job_id"]) if self.state["job_id"] else None
+            if self.state["checking"] or (previous and previous["status"] not in JobManager.FINISHED_STATUSES):
+                return None
+            self.state["checking"] = True
         try:
-            loop.run_until_complete(_run_workshop_task(workshop_input, copy_to_config, copy_to_depot))
-            TASK_STATE["status"] = "completed"
+            parallelism = min(read_startup_number("auto_refresh_parallelism", 2, minimum=1), BATCH_MAX_PARALLELISM)
+            max_apps = read_startup_number("auto_refresh_max_apps", 20, minimum=1)
+            outdated = self.pool.run(lambda: _find_outdated_apps_payload(parallelism), timeout=self.CHECK_TIMEOUT)
+            result = {"checked_at": time.time(), "outdated": [item["app_id"] for item in outdated], "job_id": None}
+            if outdated:
+                # 按上次尝试时间轮转，超出上限的游戏不会每轮都被排在后面
+                selected = sorted(outdated, key=lambda item: self.last_attempt.get(item["app_id"], 0))[:max_apps]
+                now = time.time()
+                for item in selected: self.last_attempt[item["app_id"]] = now
+                params = {"apps": selected, "parallelism": parallelism}
+                job = self.jobs.submit("refresh", lambda job: _run_refresh_task(job, **params), params)
+                result["job_id"] = job["id"]
+                print(f"自动刷新: {len(outdated)} 个游戏的清单有更新，已提交刷新任务 {job['id']}（本轮 {len(selected)} 个）。")
         except Exception as e:
-            TASK_STATE["status"] = "error"
-            message = f"发生错误: {str(e)}"
-            TASK_STATE["result"] = {"success": False, "message": message}
-            dummy_backend = CaiBackend()
-            patch_log_for_socketio(dummy_backend.log)
-            dummy_backend.log.error(dummy_backend.stack_error(e))
-        finally:
-            if TASK_STATE["status"] == "running":
-                TASK_STATE["status"] = "error"
-                TASK_STATE["result"] = {"success": False, "message": "任务意外终止。"}
-            loop.close()
-    
-    thread = threading.Thread(target=task_wrapper, daemon=True)
-    thread.start()
-    return jsonify({"success": True, "message": "创意工坊任务已开始。"})
+            result = {"checked_at": time.time(), "error": str(e)}
+            print(f"自动刷新检查失败: {e}")
+        with self.lock:
+            self.state.update(checking=False, last_run=result["checked_at"], last_result=result,
+                              job_id=result.get("job_id") or self.state["job_id"])
+        return result
+
+AUTO_REFRESH = AutoRefreshScheduler(JOBS, LOOP_POOL)
+
+# --- Library Watcher ---
+try:
+    from watchdog.observers import Observer as WatchdogObserver  # 可选：安装后实时监听目录变化
+except ImportError:
+    WatchdogObserver = None
+
+async def _initialized_backend():
+    # 监视器只做本地扫描，不进入 async with：退出上下文后 HTTP 客户端已关闭，返回的实例不应持有它
+    backend = CaiBackend()
+    await backend.initialize()
+    return backend
+
+class LibraryWatcher:
+    """监视 stplug-in、AppList 与 depotcache 目录。变化经防抖后重新扫描对应目录，与监视器自己的快照比对
+    （不依赖共享的扫描索引，入库管理页面的扫描不会吞掉变化），并把增删改事件推送到 library 房间，入库管理页面无需轮询。
+    未安装 watchdog 时每 POLL_INTERVAL 秒比对一次。"""
+    DEBOUNCE = 0.5
+    POLL_INTERVAL = 5
+    ROOM = 'library'
+    SUFFIXES = {"st": ".lua", "gl": ".txt", "depotcache": ".manifest"}
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.backend = None
+        self.paths = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.snapshots = {}  # kind -> {文件名: (大小, mtime_ns, AppID)}
+        self.observer = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='cai-library-watcher', daemon=True)
+            self.thread.start()
+
+    def dispatch(self, event):
+        # watchdog 事件处理接口；目录本身的事件忽略。重命名事件的源和目标可能在不同目录，两边都要检查
+        if event.is_directory: return
+        event_dirs = {Path(p).parent for p in (event.src_path, getattr(event, 'dest_path', None)) if p}
+        for kind, path in self.paths.items():
+            if path in event_dirs:
+                self.mark_dirty(kind)
+
+    def mark_dirty(self, kind):
+        with self.lock: self.dirty.add(kind)
+        self.wake.set()
+
+    def _setup(self):
+        self.backend = self.pool.run(_initialized_backend, timeout=60)
+        if not self.backend.steam_path:
+            return False
+        steam_path = self.backend.steam_path
+        self.paths = {"st": steam_path / 'config' / 'stplug-in', "gl": steam_path / 'AppList', "depotcache": steam_path / 'depotcache'}
+        for kind in self.paths: self._scan(kind)  # 建立初始快照
+        if WatchdogObserver is not None:
+            self.observer = WatchdogObserver()
+            for path in self.paths.values():
+                if path.exists(): self.observer.schedule(self, str(path), recursive=False)
+            self.observer.start()
+        return True
+
+    def _run(self):
+        try:
+            if not self._setup():
+                print("未找到 Steam 路径，目录监视未启动。")
+                return
+        except Exception as e:
+            print(f"启动目录监视失败: {e}")
+            return
+        print(f"目录监视已启动 ({'watchdog' if self.observer else '定时比对'})。")
+        while True:
+            if self.observer is None:
+                self.wake.wait(self.POLL_INTERVAL)
+                with self.lock: self.dirty.update(self.paths)
+            else:
+                self.wake.wait()
+            time.sleep(self.DEBOUNCE)  # 合并一次写入产生的多个事件
+            self.wake.clear()
+            with self.lock:
+                kinds, self.dirty = self.dirty, set()
+            changes = []
+            for kind in kinds:
+                try: changes.extend(self._scan(kind))
+                except Exception as e: print(f"扫描目录 {self.paths[kind]} 失败: {e}")
+            if changes:
+                MANAGER_LISTING.invalidate()
+                emit_event('library_changes', {"changes": changes}, to=self.ROOM)
+
+    def _scan(self, kind):
+        """重新扫描一个目录，返回与监视器上次快照相比的变化。"""
+        path = self.paths[kind]
+        if not path.exists(): return []
+        suffix = self.SUFFIXES[kind]
+        current = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.endswith(suffix) and entry.is_file():
+                    stat = entry.stat()
+                    current[entry.name] = (stat.st_size, stat.st_mtime_ns, None)
+        previous = self.snapshots.get(kind, {})
+        changed = [name for name, info in current.items() if name not in previous or previous[name][:2] != info[:2]]
+        if kind != "depotcache":
+            # 解析结果仍经由扫描索引缓存，只有变化的文件会被重新解析
+            parser = self.backend._parse_st_lua if kind == "st" else self.backend._parse_gl_txt
+            values = self.backend.scan_library_directory(path, suffix, parser) if changed else {}
+            for name, info in current.items():
+                value = values.get(name) if name in changed else previous[name][2]
+                current[name] = (info[0], info[1], value if isinstance(value, str) else None)
+        self.snapshots[kind] = current
+        changes = [{"filename": name, "change": "modified" if name in previous else "added", "appid": current[name][2]}
+                   for name in changed]
+        changes += [{"filename": name, "change": "removed", "appid": info[2]} for name, info in previous.items() if name not in current]
+        for change in changes: change["kind"] = kind
+        return changes
+
+LIBRARY_WATCHER = LibraryWatcher(LOOP_POOL)
+
+@app.route('/api/auto_refresh', methods=['GET'])
+def auto_refresh_status():
+    return jsonify({"success": True, **AUTO_REFRESH.status()})
+
+@app.route('/api/auto_refresh/run', methods=['POST'])
+def auto_refresh_run():
+    AUTO_REFRESH.trigger()
+    return jsonify({"success": True, "message": "已开始检查已入库游戏的清单更新。"})
+
+TASK_STATUS_MAX_WAIT = 60
+
+def _job_status_payload(job, since=None):
+    """since 为客户端已收到的最后一条日志序号，只返回更新的日志；不传时返回最近 20 条（兼容旧客户端）。
+    cursor 为当前最新的日志序号，truncated 表示有日志已被环形缓冲区丢弃。"""
+    if job is None:
+        return {"status": "idle", "progress": [], "result": None, "cursor": 0}
+    payload = JobManager.summary(job)
+    payload["job_id"] = job["id"]
+    if since is None:
+        payload["progress"] = list(job["progress"])[-20:]
+    else:
+        payload["progress"], payload["truncated"] = JOBS.progress_since(job, since)
+    payload["cursor"] = job["log_seq"]
+    return payload
+
+def _parse_task_status_args(args):
+    """解析 since / wait 参数，返回 (since 或 None, 长轮询等待秒数)。"""
+    try: since = int(args['since']) if args.get('since') not in (None, '') else None
+    except ValueError: since = None
+    try: wait = min(max(float(args.get('wait', 0)), 0), TASK_STATUS_MAX_WAIT)
+    except ValueError: wait = 0
+    return since, (wait if since is not None else 0)
 
 @app.route('/api/task_status')
 def get_task_status():
-    return jsonify({"status": TASK_STATE["status"], "progress": TASK_STATE["progress"][-20:], "result": TASK_STATE["result"]})
+    # 兼容旧接口：未指定 job_id 时返回最近提交的任务
+    job_id = request.args.get('job_id')
+    job = JOBS.get(job_id) if job_id else JOBS.latest()
+    if job_id and job is None:
+        return jsonify({"success": False, "message": f"未找到任务: {job_id}"}), 404
+    since, wait = _parse_task_status_args(request.args)
+    if job is not None and wait:
+        # 长轮询：有新日志、任务结束或超时后才返回
+        JOBS.wait_for_progress(job, since, wait)
+    return jsonify(_job_status_payload(job, since))
+
+@app.route('/api/task/<job_id>/cancel', methods=['POST'])
+def cancel_task(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": f"未找到任务: {job_id}"}), 404
+    if not JOBS.cancel(job_id):
+        return jsonify({"success": False, "message": "任务已结束，无法取消。", "status": job["status"]})
+    return jsonify({"success": True, "message": "已请求取消任务。", "status": job["status"]})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"success": True, "jobs": JOBS.list(), "max_concurrent_jobs": JOBS.max_workers})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": f"未找到任务: {job_id}"}), 404
+    return jsonify({"success": True, **_job_status_payload(job)})
+
+@app.route('/api/jobs/<job_id>/wait', methods=['GET'])
+def wait_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": f"未找到任务: {job_id}"}), 404
+    timeout = min(request.args.get('timeout', 30, type=float), 300)
+    finished = JOBS.wait(job_id, timeout)
+    return jsonify({"success": True, "finished": finished, **_job_status_payload(job)})
 
 # --- NEW: File Manager API ---
+def _stream_game_names(appids):
+    """在工作事件循环上逐个解析游戏名称，每解析完一个就通过 Socket.IO 推送给管理页面。"""
+    async def _resolve():
+        async with CaiBackend() as backend:
+            await backend.resolve_game_names(
+                appids,
+                on_resolved=lambda appid, name: emit_event('manager_game_name', {"appid": appid, "name": name})
+            )
+    def _on_done(future):
+        MANAGER_LISTING.release_pending_names(appids)
+        if future.exception():
+            dummy_backend = CaiBackend()
+            dummy_backend.log.error(dummy_backend.stack_error(future.exception()))
+        emit_event('manager_names_done', {"count": len(appids)})
+    LOOP_POOL.submit(_resolve).add_done_callback(_on_done)
+
+class ManagerListing:
+    """入库管理列表的内存索引：保存最近一次扫描结果，分页、排序与筛选都在内存中完成，
+    响应大小只取决于每页条数。名称从共享的名称缓存中读取，后台解析完成后自然生效。
+    每次重建或失效时 version 递增，翻页请求携带第一页拿到的 version，不一致说明列表已被其他页面或文件变化重建。"""
+    SORT_KEYS = ("appid", "name", "mtime", "status")
+    STATUS_ORDER = {"core_file": 0, "ok": 1, "unlocked_only": 2}
+    MAX_LIMIT = 500
+
+    def __init__(self):
+        self.data = None
+        self.version = 0
+        self.lock = threading.Lock()
+        self.resolving = set()  # 正在后台解析名称的AppID，避免翻页或刷新时重复请求
+
+    def update(self, files_data):
+        with self.lock:
+            self.data = {category: files_data.get(category, []) for category in ("st", "gl", "assistant")}
+            self.version += 1
+
+    def invalidate(self):
+        """文件被删除或目录发生变化后调用，下一次请求会重新扫描。"""
+        with self.lock:
+            self.data = None
+            self.version += 1
+
+    def is_built(self):
+        return self.data is not None
+
+    def claim_pending_names(self, appids):
+        """返回尚未在解析中的AppID，并将其标记为解析中。"""
+        with self.lock:
+            claimed = [appid for appid in appids if appid not in self.resolving]
+            self.resolving.update(claimed)
+        return claimed
+
+    def release_pending_names(self, appids):
+        with self.lock: self.resolving.difference_update(appids)
+
+    def counts(self):
+        with self.lock:
+            return {category: len(items) for category, items in (self.data or {}).items()}
+
+    def query(self, tab, offset=0, limit=100, sort="appid", order="desc", q=""):
+        """返回 (当前页条目, 筛选后总数, 列表 version)。"""
+        with self.lock:
+            items = list((self.data or {}).get(tab, []))
+            version = self.version
+        items = [dict(item, game_name=MANAGER_NAME_CACHE.get(item["appid"], item["game_name"])) for item in items]
+        if q:
+            q = q.lower()
+            items = [item for item in items
+                     if q in item["filename"].lower() or q in item["appid"].lower() or q in item["game_name"].lower()]
+        # 核心文件始终置顶，其余按所选字段排序，相同时按AppID降序
+        core = [item for item in items if item["status"] == "core_file"]
+        rest = [item for item in items if item["status"] != "core_file"]
+        rest.sort(key=lambda item: int(item["appid"]) if item["appid"].isdigit() else 0, reverse=True)
+        if sort == "name":
+            # 名称尚未解析的条目排在最后
+            known = [item for item in rest if item["appid"] in MANAGER_NAME_CACHE]
+            known.sort(key=lambda item: item["game_name"].casefold(), reverse=order == "desc")
+            rest = known + [item for item in rest if item["appid"] not in MANAGER_NAME_CACHE]
+        elif sort == "mtime":
+            rest.sort(key=lambda item: item.get("mtime") or 0, reverse=order == "desc")
+        elif sort == "status":
+            rest.sort(key=lambda item: self.STATUS_ORDER.get(item["status"], 9), reverse=order == "desc")
+        elif order == "asc":
+            rest.reverse()
+        items = core + rest
+        return items[offset:offset + limit], len(items), version
+
+MANAGER_LISTING = ManagerListing()
+
+def _parse_manager_query(args):
+    """解析 /api/manager/files 的分页参数；未提供 limit 时返回 None，沿用一次性返回全部条目的旧格式。"""
+    if args.get('limit') in (None, ''):
+        return None
+    def _int(name, default):
+        try: return int(args.get(name, default))
+        except (TypeError, ValueError): return default
+    sort = args.get('sort', 'appid')
+    return {
+        "tab": args.get('tab', 'st') if args.get('tab') in ("st", "gl", "assistant") else 'st',
+        "offset": max(0, _int('offset', 0)),
+        "limit": min(max(1, _int('limit', 100)), ManagerListing.MAX_LIMIT),
+        "sort": sort if sort in ManagerListing.SORT_KEYS else 'appid',
+        "order": 'asc' if args.get('order') == 'asc' else 'desc',
+        "q": args.get('q', '').strip(),
+        "refresh": _parse_bool(args.get('refresh', False)),
+        "version": _int('version', None),
+    }
+
+async def _manager_files_payload(query=None):
+    # 只在明确要求刷新 (refresh)、索引尚未建立或已失效时重新扫描；搜索、排序、切换标签和翻页都直接读取内存索引
+    pending_names = []
+    if query is not None:
+        query = dict(query)
+        refresh, version = query.pop("refresh"), query.pop("version")
+        if query["offset"] > 0 and version is not None and version != MANAGER_LISTING.version:
+            # 列表已被重建，继续翻页会跳过或重复条目，由前端从第一页重新加载
+            return {"success": True, "stale": True, "version": MANAGER_LISTING.version}
+    if query is None or refresh or not MANAGER_LISTING.is_built():
+        async with CaiBackend() as backend:
+            await backend.initialize()
+            # 只做本地扫描，名称稍后通过 Socket.IO 推送
+            files_data = await backend.get_managed_files(fetch_names=False)
+        if files_data.get("error"):
+            return {"success": False, "message": files_data["error"]}
+        pending_names = MANAGER_LISTING.claim_pending_names(files_data.pop('pending_names', []))
+        MANAGER_LISTING.update(files_data)
+        if pending_names:
+            _stream_game_names(pending_names)
+    if query is None:
+        return {"success": True, "data": files_data, "pending_names": len(pending_names)}
+    items, total, version = MANAGER_LISTING.query(**query)
+    return {"success": True, "tab": query["tab"], "items": items, "total": total, "offset": query["offset"], "version": version,
+            "limit": query["limit"], "has_more": query["offset"] + len(items) < total,
+            "counts": MANAGER_LISTING.counts(), "pending_names": len(pending_names)}
+
 @app.route('/api/manager/files', methods=['GET'])
 def get_managed_files():
     try:
-        async def _get_files():
-            async with CaiBackend() as backend:
-                await backend.initialize()
-                files_data = await backend.get_managed_files()
-                return {"success": True, "data": files_data}
-        
-        result = asyncio.run(_get_files())
-        return jsonify(result)
+        return jsonify(asyncio.run(_manager_files_payload(_parse_manager_query(request.args))))
         
     except Exception as e:
         dummy_backend = CaiBackend()
@@ -454,6 +1498,7 @@ def delete_managed_files():
                 return backend.delete_managed_files(file_type, items)
         
         result = asyncio.run(_delete())
+        MANAGER_LISTING.invalidate()
         return jsonify(result)
 
     except Exception as e:
@@ -462,6 +1507,31 @@ def delete_managed_files():
         dummy_backend.log.error(dummy_backend.stack_error(e))
         return jsonify({"success": False, "message": message}), 500
 
+@app.route('/api/manager/depotcache_gc', methods=['POST'])
+def depotcache_gc():
+    # 默认只统计无引用清单 (dry_run)，明确传入 dry_run=false 时才删除
+    data = request.get_json(silent=True) or {}
+    dry_run = _parse_bool(data.get('dry_run', True))
+    try: min_age_hours = float(data.get('min_age_hours', DEPOTCACHE_GC_MIN_AGE_HOURS))
+    except (TypeError, ValueError): min_age_hours = DEPOTCACHE_GC_MIN_AGE_HOURS
+    min_age_hours = max(0.0, min_age_hours)
+
+    try:
+        async def _collect():
+            async with CaiBackend() as backend:
+                await backend.initialize()
+                return backend.collect_depotcache_garbage(dry_run=dry_run, min_age_hours=min_age_hours)
+
+        result = asyncio.run(_collect())
+        if not dry_run: MANAGER_LISTING.invalidate()
+        return jsonify(result)
+
+    except Exception as e:
+        dummy_backend = CaiBackend()
+        message = f"清理清单时发生错误: {str(e)}"
+        dummy_backend.log.error(dummy_backend.stack_error(e))
+        return jsonify({"success": False, "message": message}), 500
+
 @app.route('/api/manager/open_folder', methods=['POST'])
 def open_manager_folder():
     if sys.platform != 'win32':
@@ -515,6 +1585,19 @@ def get_detailed_config():
             "background_brightness": config.get("background_brightness", 100),
             "show_console_on_startup": config.get("show_console_on_startup", False),
             "force_unlocker_type": config.get("force_unlocker_type", "auto"),
+            "max_concurrent_jobs": config.get("max_concurrent_jobs", 3),
+            "worker_event_loops": config.get("worker_event_loops", 2),
+            "server_mode": config.get("server_mode", "flask"),
+            "job_journal": config.get("job_journal", True),
+            "auto_refresh_interval_hours": config.get("auto_refresh_interval_hours", 0),
+            "auto_refresh_max_apps": config.get("auto_refresh_max_apps", 20),
+            "auto_refresh_parallelism": config.get("auto_refresh_parallelism", 2),
+            "incremental_update": config.get("incremental_update", True),
+            "log_max_bytes": config.get("log_max_bytes", 10 * 1024 * 1024),
+            "log_backup_count": config.get("log_backup_count", 5),
+            "log_json_lines": config.get("log_json_lines", False),
+            "library_watcher": config.get("library_watcher", True),
+            "scan_workers": config.get("scan_workers", 8),
             # NEW: 添加自定义清单库配置
             "custom_repos": config.get("Custom_Repos", {"github": [], "zip": []}),
         }})
@@ -542,7 +1625,11 @@ def update_config():  # 改为同步函数
         updatable_keys = [
             "github_token", "steam_path", "debug_mode", "logging_files",
             "background_image_path", "background_blur", "background_saturation", 
-            "background_brightness", "show_console_on_startup", "force_unlocker_type"
+            "background_brightness", "show_console_on_startup", "force_unlocker_type",
+            "max_concurrent_jobs", "worker_event_loops", "server_mode", "job_journal",
+            "auto_refresh_interval_hours", "auto_refresh_max_apps", "auto_refresh_parallelism",
+            "incremental_update", "log_max_bytes", "log_backup_count", "log_json_lines",
+            "library_watcher", "scan_workers"
         ]
         key_map = {
             "github_token": "Github_Personal_Token",
@@ -551,6 +1638,9 @@ def update_config():  # 改为同步函数
         
         for key in updatable_keys:
             if key in data:
+                error = _validate_config_value(key, data[key])
+                if error:
+                    return jsonify({"success": False, "message": f"配置项 {key} 无效: {error}"}), 400
                 config_key = key_map.get(key, key)
                 current_config[config_key] = data[key]
 
@@ -569,6 +1659,32 @@ def update_config():  # 改为同步函数
         print(f"保存配置失败: {e}")  # 添加错误日志
         return jsonify({"success": False, "message": f"保存配置失败: {e}"})
 
+# 保存前校验的配置项：数值型为 (类型, 最小值)，其余为布尔值或可选值列表
+CONFIG_NUMBER_KEYS = {
+    "max_concurrent_jobs": (int, 1), "worker_event_loops": (int, 1),
+    "auto_refresh_interval_hours": (float, 0), "auto_refresh_max_apps": (int, 1), "auto_refresh_parallelism": (int, 1),
+    "log_max_bytes": (int, 0), "log_backup_count": (int, 0), "scan_workers": (int, 1),
+    "background_blur": (float, 0), "background_saturation": (float, 0), "background_brightness": (float, 0),
+}
+CONFIG_BOOL_KEYS = {"debug_mode", "logging_files", "show_console_on_startup", "job_journal", "incremental_update",
+                    "log_json_lines", "library_watcher"}
+CONFIG_CHOICE_KEYS = {"server_mode": ("flask", "asgi"), "force_unlocker_type": ("auto", "steamtools", "greenluma")}
+
+def _validate_config_value(key, value):
+    """返回错误说明，值有效时返回 None。"""
+    if key in CONFIG_NUMBER_KEYS:
+        cast, minimum = CONFIG_NUMBER_KEYS[key]
+        # bool 是 int 的子类，需单独排除；整数项不接受小数
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (cast is int and not float(value).is_integer()):
+            return "需要数字"
+        if value < minimum:
+            return f"不能小于 {minimum}"
+    elif key in CONFIG_BOOL_KEYS and not isinstance(value, bool):
+        return "需要布尔值"
+    elif key in CONFIG_CHOICE_KEYS and value not in CONFIG_CHOICE_KEYS[key]:
+        return f"可选值为 {', '.join(CONFIG_CHOICE_KEYS[key])}"
+    return None
+
 @app.route('/api/config/reset', methods=['POST'])
 def reset_config():  # 改为同步函数
     config_path = project_root / 'config.json'
@@ -618,6 +1734,31 @@ def upload_background():
         except Exception as e:
             return jsonify({"success": False, "message": f"保存文件失败: {e}"}), 500
 
+@app.route('/api/app_index/status', methods=['GET'])
+def app_index_status():
+    backend = CaiBackend()
+    local_index = backend.get_local_index()
+    if not local_index:
+        return jsonify({"success": True, "available": False})
+    return jsonify({"success": True, "available": True, "app_count": local_index.record_count,
+                    "size": (project_root / LOCAL_APP_INDEX_FILENAME).stat().st_size})
+
+@app.route('/api/app_index/import', methods=['POST'])
+def import_app_index():
+    if 'appListFile' not in request.files: return jsonify({"success": False, "message": "未找到文件"}), 400
+    file = request.files['appListFile']
+    if file.filename == '': return jsonify({"success": False, "message": "未选择文件"}), 400
+    userdata_folder = app.config['USER_DATA_FOLDER']
+    userdata_folder.mkdir(exist_ok=True)
+    source_path = userdata_folder / f"app_list{Path(file.filename).suffix}"
+    try:
+        file.save(source_path)
+        count = import_local_app_index(source_path, project_root / LOCAL_APP_INDEX_FILENAME)
+        SEARCH_CACHE.clear()
+        return jsonify({"success": True, "message": f"本地游戏索引已建立，共 {count} 个应用。", "app_count": count})
+    except Exception as e:
+        return jsonify({"success": False, "message": f"导入应用列表失败: {e}"}), 500
+
 @app.route('/userdata/<path:filename>')
 def serve_userdata(filename): return send_from_directory(app.config['USER_DATA_FOLDER'], filename)
 
@@ -653,11 +1794,41 @@ def toggle_console():
 @socketio.on('connect')
 def handle_connect(): emit('response', {"message": "已连接到 Cai Install 服务器"})
 
+def _job_replay_payload(data):
+    """订阅任务日志时补发客户端错过的部分：since 为客户端已收到的最后一条日志序号。"""
+    job = JOBS.get((data or {}).get('job_id'))
+    if job is None: return None
+    try: since = int(data.get('since', 0))
+    except (TypeError, ValueError): since = 0
+    entries, truncated = JOBS.progress_since(job, since)
+    return {"entries": entries, "replay": True, "truncated": truncated}
+
+@socketio.on('subscribe_job')
+def handle_subscribe_job(data):
+    payload = _job_replay_payload(data)
+    if payload is None: return
+    join_room(data['job_id'])
+    emit('task_progress_batch', payload)
+
+@socketio.on('unsubscribe_job')
+def handle_unsubscribe_job(data):
+    if (data or {}).get('job_id'): leave_room(data['job_id'])
+
+@socketio.on('subscribe_library')
+def handle_subscribe_library(data=None):
+    join_room(LibraryWatcher.ROOM)
+
 @app.route('/api/shutdown', methods=['POST'])
 def shutdown():
     print("接收到 HTTP 关闭请求，正在准备关闭服务器...")
     def kill_process():
         time.sleep(0.5)
+        # os._exit 不会执行 atexit，先把任务日志中排队的步骤写盘（恢复任务时依赖它们跳过已下载的清单），并停止文件日志线程
+        try:
+            if JOURNAL: JOURNAL.flush()
+            FILE_LOG_SERVICE.stop()
+        except Exception as e:
+            print(f"关闭前写入任务日志失败: {e}")
         os._exit(0)
     threading.Thread(target=kill_process, daemon=True).start()
     return jsonify({"success": True, "message": "服务器正在关闭..."})
@@ -684,4 +1855,13 @@ if __name__ == '__main__':
     print("正在启动 Cai Install Web GUI...")
     print(f"服务器将在 {url} 上运行")
     threading.Timer(1.5, open_browser).start()
+    resume_interrupted_jobs()
+    AUTO_REFRESH.start()
+    if read_startup_config_value("library_watcher", True):
+        LIBRARY_WATCHER.start()
+    if read_startup_config_value("server_mode", "flask") == "asgi":
+        # ASGI 模式：同一组路由以协程方式运行在 uvicorn 上，Socket.IO 共用同一个服务器
+        from asgi_server import run_asgi_server
+        run_asgi_server(sys.modules[__name__], port)
+        sys.exit(0)
     socketio.run(app, host='127.0.0.1', port=port, debug=False, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,184 @@
+# --- ASGI 模式 (server_mode = "asgi") ---
+# 高频接口（初始化、清单源、搜索、任务状态、入库管理列表）以协程方式处理，
+# 后端协程交给 LOOP_POOL 的常驻事件循环执行，等待期间不占用服务器线程；
+# 其余路由原样交给 Flask 应用处理。Socket.IO 与 HTTP 共用同一个 uvicorn 服务器。
+
+import asyncio
+
+try:
+    import socketio as python_socketio
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Mount, Route
+except ImportError as e:
+    raise ImportError(f"ASGI 模式需要安装 starlette、uvicorn 和 python-socketio: {e}")
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+
+def create_asgi_app(web):
+    """web 为已加载的 app 模块，复用其中的 Flask 应用、LOOP_POOL、JOBS 与各 _xxx_payload 协程。"""
+    sio = python_socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+    server_loop = {}
+
+    def emit_from_any_thread(event, data, to=None):
+        # 日志可能来自工作事件循环线程，统一调度到服务器所在的事件循环上发送
+        loop = server_loop.get('loop')
+        if loop is None or loop.is_closed(): return
+        asyncio.run_coroutine_threadsafe(sio.emit(event, data, to=to), loop)
+
+    async def on_startup():
+        server_loop['loop'] = asyncio.get_running_loop()
+        web.set_event_emitter(emit_from_any_thread)
+
+    @sio.event
+    async def connect(sid, environ):
+        await sio.emit('response', {"message": "已连接到 Cai Install 服务器"}, to=sid)
+
+    @sio.event
+    async def subscribe_job(sid, data):
+        payload = web._job_replay_payload(data)
+        if payload is None: return
+        await sio.enter_room(sid, data['job_id'])
+        await sio.emit('task_progress_batch', payload, to=sid)
+
+    @sio.event
+    async def unsubscribe_job(sid, data):
+        if (data or {}).get('job_id'): await sio.leave_room(sid, data['job_id'])
+
+    @sio.event
+    async def subscribe_library(sid, data=None):
+        await sio.enter_room(sid, web.LibraryWatcher.ROOM)
+
+    def error_response(prefix, e, status_code=200):
+        dummy_backend = web.CaiBackend()
+        dummy_backend.log.error(dummy_backend.stack_error(e))
+        return JSONResponse({"success": False, "message": f"{prefix}: {e}"}, status_code=status_code)
+
+    async def initialize_app(request):
+        try:
+            return JSONResponse(await web.LOOP_POOL.run_async(web._initialize_payload))
+        except Exception as e:
+            return error_response("后端初始化失败", e)
+
+    async def check_updates(request):
+        try:
+            return JSONResponse(await web.LOOP_POOL.run_async(web._check_updates_payload))
+        except Exception as e:
+            return error_response("检查更新失败", e)
+
+    async def get_sources(request):
+        try:
+            return JSONResponse(await web.LOOP_POOL.run_async(web._sources_payload))
+        except Exception as e:
+            return error_response("获取清单源失败", e)
+
+    async def probe_sources(request):
+        app_id_input = request.query_params.get('app_id', '').strip()
+        if not app_id_input:
+            return JSONResponse({"success": False, "message": "请输入 AppID 或链接。"}, status_code=400)
+        use_cache = not web._parse_bool(request.query_params.get('refresh', False))
+        try:
+            return JSONResponse(await web.LOOP_POOL.run_async(lambda: web._probe_sources_payload(app_id_input, use_cache)))
+        except Exception as e:
+            return error_response("探测清单源失败", e)
+
+    async def search_game(request):
+        data = await request.json()
+        game_name = data.get('game_name', '').strip()
+        if not game_name:
+            return JSONResponse({"success": False, "message": "请输入游戏名称。"}, status_code=400)
+        try:
+            results = await web.LOOP_POOL.run_async(lambda: web._run_search_game_task(game_name))
+            return JSONResponse({"success": True, "games": results})
+        except Exception as e:
+            return error_response("搜索时发生错误", e, 500)
+
+    async def search_game_typeahead(request):
+        game_name = request.query_params.get('q', '').strip()
+        client_id = request.query_params.get('client_id', request.client.host if request.client else '')
+        try: seq = int(request.query_params.get('seq', 0))
+        except ValueError: seq = 0
+        early = web._typeahead_before_debounce(game_name, client_id, seq)
+        if early is not None:
+            return JSONResponse(early)
+
+        await asyncio.sleep(web.TYPEAHEAD_DEBOUNCE_SECONDS)
+        early = web._typeahead_after_debounce(game_name, client_id, seq)
+        if early is not None:
+            return JSONResponse(early)
+
+        try:
+            results = await web.LOOP_POOL.run_async(
+                lambda: web._run_search_game_task(game_name, lambda: web._is_stale_typeahead(client_id, seq)))
+        except Exception as e:
+            dummy_backend = web.CaiBackend()
+            dummy_backend.log.error(dummy_backend.stack_error(e))
+            return JSONResponse({"success": False, "message": f"搜索时发生错误: {e}", "seq": seq}, status_code=500)
+        if results is None or web._is_stale_typeahead(client_id, seq):
+            return JSONResponse({"success": True, "stale": True, "seq": seq})
+        return JSONResponse({"success": True, "games": results, "seq": seq, "partial": False})
+
+    async def get_task_status(request):
+        job_id = request.query_params.get('job_id')
+        job = web.JOBS.get(job_id) if job_id else web.JOBS.latest()
+        if job_id and job is None:
+            return JSONResponse({"success": False, "message": f"未找到任务: {job_id}"}, status_code=404)
+        since, wait = web._parse_task_status_args(request.query_params)
+        if job is not None and wait:
+            await web.JOBS.wait_for_progress_async(job, since, wait)
+        return JSONResponse(web._job_status_payload(job, since))
+
+    async def list_jobs(request):
+        return JSONResponse({"success": True, "jobs": web.JOBS.list(), "max_concurrent_jobs": web.JOBS.max_workers})
+
+    async def get_job(request):
+        job_id = request.path_params['job_id']
+        job = web.JOBS.get(job_id)
+        if job is None:
+            return JSONResponse({"success": False, "message": f"未找到任务: {job_id}"}, status_code=404)
+        return JSONResponse({"success": True, **web._job_status_payload(job)})
+
+    async def wait_job(request):
+        job_id = request.path_params['job_id']
+        job = web.JOBS.get(job_id)
+        if job is None:
+            return JSONResponse({"success": False, "message": f"未找到任务: {job_id}"}, status_code=404)
+        try: timeout = min(float(request.query_params.get('timeout', 30)), 300)
+        except ValueError: timeout = 30
+        finished = await web.JOBS.wait_async(job_id, timeout)
+        return JSONResponse({"success": True, "finished": finished, **web._job_status_payload(job)})
+
+    async def get_managed_files(request):
+        try:
+            query = web._parse_manager_query(request.query_params)
+            return JSONResponse(await web.LOOP_POOL.run_async(lambda: web._manager_files_payload(query)))
+        except Exception as e:
+            return error_response("获取文件列表失败", e)
+
+    routes = [
+        Route('/api/initialize', initialize_app, methods=['POST']),
+        Route('/api/check_updates', check_updates, methods=['POST']),
+        Route('/api/sources', get_sources, methods=['GET']),
+        Route('/api/sources/probe', probe_sources, methods=['GET']),
+        Route('/api/search_game', search_game, methods=['POST']),
+        Route('/api/search_game/typeahead', search_game_typeahead, methods=['GET']),
+        Route('/api/task_status', get_task_status, methods=['GET']),
+        Route('/api/jobs', list_jobs, methods=['GET']),
+        Route('/api/jobs/{job_id}', get_job, methods=['GET']),
+        Route('/api/jobs/{job_id}/wait', wait_job, methods=['GET']),
+        Route('/api/manager/files', get_managed_files, methods=['GET']),
+        # 其余页面与接口仍由 Flask 处理
+        Mount('/', app=WSGIMiddleware(web.app)),
+    ]
+    http_app = Starlette(routes=routes)
+    return python_socketio.ASGIApp(sio, other_asgi_app=http_app, on_startup=on_startup)
+
+
+def run_asgi_server(web, port):
+    print("以 ASGI 模式启动 (uvicorn)...")
+    uvicorn.run(create_asgi_app(web), host='127.0.0.1', port=port, log_level='warning')
@@ -3,6 +3,9 @@ import os
 import traceback
 import time
 import logging
+import logging.handlers
+import queue
+import atexit
 import subprocess
 import asyncio
 import re
@@ -19,12 +22,29 @@ import shutil
 import struct
 import zlib
 import io  # For workshop manifest processing
+import mmap
+import heapq
+import threading
+import contextlib
+import contextvars
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Any, List, Dict, Literal
+from typing import Tuple, Any, List, Dict, Literal, Callable
 from urllib.parse import quote
+from email.utils import parsedate_to_datetime
+from datetime import datetime
 
 CURRENT_VERSION = "2.5"  # 当前版本号
 GITHUB_REPO = "pvzcxw/Cai-install-Web-GUI" 
+LOCAL_APP_INDEX_FILENAME = "app_index.bin"  # 本地游戏名称索引文件
+LIBRARY_SCAN_INDEX_FILENAME = "library_scan_index.json"  # 入库管理扫描索引文件
+WRITTEN_MANIFESTS_FILENAME = "written_manifests.json"  # 本工具写入过的清单文件列表，清理无引用清单时只删除其中的文件
+PARALLEL_SCAN_MIN_FILES = 64  # 需要解析的文件少于此数时不值得开线程池
+TITLE_SCAN_MAX_BYTES = 64 * 1024  # 提取网页标题时最多读取的字节数
+MANAGER_NAME_FAILURES = ("无效AppID", "名称未找到", "获取失败")  # 不写入共享名称缓存的结果，下次仍会重新获取
+DEPOTCACHE_GC_MIN_AGE_HOURS = 24  # 清理无引用清单时跳过最近修改的文件，避免误删正在进行的入库任务刚写入的清单
 
 # --- LOGGING SETUP ---
 LOG_FORMAT = '%(log_color)s%(message)s'
@@ -34,6 +54,8 @@ LOG_COLORS = {
     'ERROR': 'red',
     'CRITICAL': 'purple',
 }
+FILE_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(job_id)s] %(message)s'
+FILE_LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
 
 # --- MODIFIED: Added Custom_Repos setting ---
 DEFAULT_CONFIG = {
@@ -47,6 +69,19 @@ DEFAULT_CONFIG = {
     "background_brightness": 80, 
     "show_console_on_startup": False,
     "force_unlocker_type": "auto",
+    "max_concurrent_jobs": 3,
+    "worker_event_loops": 2,
+    "server_mode": "flask",
+    "job_journal": True,
+    "auto_refresh_interval_hours": 0,
+    "auto_refresh_max_apps": 20,
+    "auto_refresh_parallelism": 2,
+    "incremental_update": True,
+    "log_max_bytes": 10 * 1024 * 1024,
+    "log_backup_count": 5,
+    "log_json_lines": False,
+    "library_watcher": True,
+    "scan_workers": 8,
     "Custom_Repos": {
         "github": [],
         "zip": []
@@ -55,7 +90,15 @@ DEFAULT_CONFIG = {
     "QA2": "Force_Unlocker: 强制指定解锁工具, 填入 'steamtools' 或 'greenluma'。留空则自动检测。",
     "QA3": "Custom_Repos: 自定义清单库配置。github数组用于添加GitHub仓库，zip数组用于添加ZIP清单库。",
     "QA4": "GitHub仓库格式: {\"name\": \"显示名称\", \"repo\": \"用户名/仓库名\"}",
-    "QA5": "ZIP清单库格式: {\"name\": \"显示名称\", \"url\": \"下载URL，用{app_id}作为占位符\"}"
+    "QA5": "ZIP清单库格式: {\"name\": \"显示名称\", \"url\": \"下载URL，用{app_id}作为占位符\"}",
+    "QA6": "max_concurrent_jobs: 同时运行的入库任务数上限；worker_event_loops: 常驻工作事件循环数量。修改后重启生效。",
+    "QA7": "server_mode: 'flask' 为默认的线程模式；'asgi' 使用 uvicorn 以协程方式处理接口（需安装 starlette、uvicorn、python-socketio）。",
+    "QA8": "job_journal: 将任务进度记录到 userdata/jobs.db，程序被关闭或崩溃后，下次启动会自动恢复未完成的任务并跳过已完成的步骤（同一任务最多恢复 3 次）。",
+    "QA9": "auto_refresh_interval_hours: 每隔多少小时检查已入库游戏的上游清单，只为清单有变化的游戏提交刷新任务（0 为关闭）。刷新只替换 lua 中变化的 setManifestid 行或下载新版本清单，不改动 DLC、密钥等其他解锁内容；auto_refresh_max_apps: 每轮最多刷新的游戏数，其余留到下一轮；auto_refresh_parallelism: 刷新任务的并发数。",
+    "QA10": "incremental_update: 重新入库时只下载 depotcache 中缺少的清单，密钥未变化时不重写 config.vdf。",
+    "QA11": "log_max_bytes / log_backup_count: 日志文件超过指定大小后轮转，保留指定数量的旧文件；log_json_lines: 以 JSON Lines 格式（每行一条，含任务ID）写入日志文件。",
+    "QA12": "library_watcher: 监视 stplug-in、AppList 与 depotcache 目录，文件变化时自动同步到入库管理页面（安装 watchdog 后为实时监听，否则每隔几秒比对一次）。修改后重启生效。",
+    "QA13": "scan_workers: 扫描入库目录时并行解析文件的线程数（1 为单线程）。"
 }
 
 class STConverter:
@@ -88,6 +131,688 @@ class STConverter:
         metadata = {'original_xorkey': xorkey, 'size': size, 'xorkeyverify': xorkeyverify}
         return lua_content, metadata
 
+class SearchResultCache:
+    """游戏搜索结果的 LRU + TTL 缓存，进程内共享（每个请求都会新建 CaiBackend）。
+    对于未缓存的查询，可以用已缓存的较短前缀的结果在本地过滤出即时答案。"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, List[Dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def _get_fresh(self, key: str) -> List[Dict] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, results = entry
+        if time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return results
+
+    def get(self, query: str) -> List[Dict] | None:
+        with self._lock:
+            return self._get_fresh(self.normalize(query))
+
+    def get_by_prefix(self, query: str) -> List[Dict] | None:
+        """查找最长的已缓存前缀，并用查询中的每个词过滤其结果。没有可用前缀时返回 None。"""
+        key = self.normalize(query)
+        tokens = key.split()
+        with self._lock:
+            for end in range(len(key) - 1, 0, -1):
+                results = self._get_fresh(key[:end].rstrip())
+                if results is not None:
+                    return [game for game in results if all(tok in game.get('name', '').lower() for tok in tokens)]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def put(self, query: str, results: List[Dict]):
+        with self._lock:
+            key = self.normalize(query)
+            self._entries[key] = (time.time(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+SEARCH_CACHE = SearchResultCache()
+
+# 常驻工作事件循环提供的共享 HTTP 客户端；设置后 CaiBackend 复用它，不再每个任务新建连接
+SHARED_HTTP_CLIENT: contextvars.ContextVar[httpx.AsyncClient | None] = contextvars.ContextVar('shared_http_client', default=None)
+
+def new_shared_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(verify=False, trust_env=True)
+
+# 任务日志的步骤记录回调 (step, detail)，由任务管理器在运行任务前设置，用于重启后恢复
+JOB_STEP_RECORDER: contextvars.ContextVar[Callable[[str, str], None] | None] = contextvars.ContextVar('job_step_recorder', default=None)
+# 恢复中断的任务时，任务日志中该任务已完成的步骤 {step: detail}
+JOB_COMPLETED_STEPS: contextvars.ContextVar[Dict[str, str] | None] = contextvars.ContextVar('job_completed_steps', default=None)
+
+# 当前协程所属的任务ID，写入文件日志用于区分并发任务的输出
+LOG_JOB_ID: contextvars.ContextVar[str | None] = contextvars.ContextVar('log_job_id', default=None)
+
+class JobTagFilter(logging.Filter):
+    """在调用线程中给日志记录打上任务ID（进入队列后就无法再读取协程上下文）。"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.job_id = LOG_JOB_ID.get() or '-'
+        return True
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "time": self.formatTime(record, FILE_LOG_DATEFMT), "level": record.levelname,
+            "job_id": getattr(record, 'job_id', '-'), "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+class FileLogService:
+    """文件日志：记录经 QueueHandler 放入队列，由 QueueListener 的专用线程格式化并写入按大小轮转的文件，
+    下载协程中不再有磁盘写入。每次初始化后端都会调用 configure()，设置不变时复用已有的监听线程。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue_handler: logging.handlers.QueueHandler | None = None
+        self.listener: logging.handlers.QueueListener | None = None
+        self.settings: Tuple | None = None
+
+    def configure(self, logger: logging.Logger, settings: Tuple | None) -> bool:
+        """settings 为 (文件路径, 等级, 单文件最大字节数, 保留数量, 是否 JSON Lines)，None 表示关闭文件日志。
+        返回是否（重新）启动了文件日志。"""
+        with self.lock:
+            if settings == self.settings:
+                if self.queue_handler is not None and self.queue_handler not in logger.handlers:
+                    logger.addHandler(self.queue_handler)
+                return False
+            self._stop(logger)
+            self.settings = settings
+            if settings is None:
+                return False
+            log_file_path, level, max_bytes, backup_count, json_lines = settings
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file_path, 'a', maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+            file_handler.setLevel(level)
+            file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(FILE_LOG_FORMAT, datefmt=FILE_LOG_DATEFMT))
+            log_queue = queue.SimpleQueue()
+            self.queue_handler = logging.handlers.QueueHandler(log_queue)
+            self.queue_handler.setLevel(level)
+            self.queue_handler.addFilter(JobTagFilter())
+            self.listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+            self.listener.start()
+            logger.addHandler(self.queue_handler)
+            return True
+
+    def _stop(self, logger: logging.Logger | None = None):
+        if self.queue_handler is not None and logger is not None:
+            logger.removeHandler(self.queue_handler)
+        if self.listener is not None:
+            self.listener.stop()  # 写完队列中剩余的记录
+            for handler in self.listener.handlers:
+                handler.close()
+        self.queue_handler = self.listener = None
+
+    def stop(self):
+        with self.lock:
+            self._stop(logging.getLogger(' Cai install'))
+            self.settings = None
+
+
+FILE_LOG_SERVICE = FileLogService()
+atexit.register(FILE_LOG_SERVICE.stop)
+
+# 当前协程新建文件的记录列表；批量任务为每个 AppID 单独设置，取消时只清理未完成的部分
+CREATED_FILES: contextvars.ContextVar[List[Path] | None] = contextvars.ContextVar('created_files', default=None)
+
+def atomic_write_text(path: Path, text: str):
+    """先写入同目录下名称唯一的临时文件再替换目标文件，并发写入时不会互相覆盖临时文件，读者也不会看到写了一半的内容。"""
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError): os.remove(tmp_name)
+        raise
+
+# config.vdf、AppList 等全局文件可能被多个并发任务同时改写，用进程级锁串行化
+STEAM_CONFIG_LOCK = threading.Lock()
+STEAM_CONFIG_LOCK_POLL_SECONDS = 0.05
+
+
+class LocalAppIndex:
+    """离线 AppID <-> 游戏名称索引，从 (appid,name) 列表文件构建，存为可直接 mmap 的二进制文件。
+
+    文件布局（小端）:
+        头部      magic, 记录数, 二元组数, 倒排项数, 名称区字节数
+        记录区    (appid, 名称偏移, 名称长度) * 记录数，按 appid 排序
+        二元组区  (二元组哈希, 倒排偏移, 倒排数量) * 二元组数，按哈希排序
+        倒排区    记录下标 (uint32)
+        名称区    UTF-8 名称
+    """
+
+    MAGIC = b'CAIIDX01'
+    HEADER = struct.Struct('<8sIIII')
+    RECORD = struct.Struct('<III')
+    GRAM = struct.Struct('<III')
+
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        self._file = open(index_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.record_count, self.gram_count, postings_count, names_size = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"无效的本地索引文件: {index_path}")
+        self._records_at = self.HEADER.size
+        self._grams_at = self._records_at + self.record_count * self.RECORD.size
+        self._postings_at = self._grams_at + self.gram_count * self.GRAM.size
+        self._names_at = self._postings_at + postings_count * 4
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    @staticmethod
+    def _gram_hash(gram: str) -> int:
+        return zlib.crc32(gram.encode('utf-8'))
+
+    @classmethod
+    def _grams(cls, normalized: str) -> set:
+        return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+    @staticmethod
+    def parse_app_list(source_path: Path) -> Dict[int, str]:
+        """读取应用列表文件。支持每行 "appid,name"（或制表符分隔）的文本，以及 Steam GetAppList 的 JSON。"""
+        raw = source_path.read_text(encoding='utf-8', errors='ignore')
+        apps = {}
+        if raw.lstrip().startswith(('{', '[')):
+            data = json.loads(raw)
+            if isinstance(data, dict):
+                data = data.get('applist', data).get('apps', [])
+            for app in data:
+                appid, name = str(app.get('appid', '')).strip(), str(app.get('name', '')).strip()
+                if appid.isdigit() and name:
+                    apps[int(appid)] = name
+            return apps
+        for line in raw.splitlines():
+            sep = '\t' if '\t' in line else ','
+            appid, _, name = line.partition(sep)
+            appid, name = appid.strip().strip('"'), name.strip().strip('"')
+            if appid.isdigit() and name:
+                apps[int(appid)] = name
+        return apps
+
+    @classmethod
+    def build(cls, apps: Dict[int, str], index_path: Path) -> Tuple[int, Path]:
+        """将 {appid: name} 写入临时索引文件，返回 (记录数, 临时文件路径)，由调用方负责替换。"""
+        appids = sorted(apps)
+        names_blob = bytearray()
+        records = []
+        postings: Dict[int, List[int]] = {}
+        for idx, appid in enumerate(appids):
+            encoded = apps[appid].encode('utf-8')
+            records.append((appid, len(names_blob), len(encoded)))
+            names_blob.extend(encoded)
+            for gram in cls._grams(cls.normalize(apps[appid])):
+                postings.setdefault(cls._gram_hash(gram), []).append(idx)
+
+        gram_table, postings_blob = [], bytearray()
+        for gram_hash in sorted(postings):
+            entries = postings[gram_hash]
+            gram_table.append((gram_hash, len(postings_blob) // 4, len(entries)))
+            postings_blob.extend(struct.pack(f'<{len(entries)}I', *entries))
+
+        tmp_path = index_path.with_suffix(index_path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(records), len(gram_table), len(postings_blob) // 4, len(names_blob)))
+            for record in records:
+                f.write(cls.RECORD.pack(*record))
+            for gram in gram_table:
+                f.write(cls.GRAM.pack(*gram))
+            f.write(postings_blob)
+            f.write(names_blob)
+        return len(records), tmp_path
+
+    def _record(self, idx: int) -> Tuple[int, str]:
+        appid, offset, length = self.RECORD.unpack_from(self._mm, self._records_at + idx * self.RECORD.size)
+        start = self._names_at + offset
+        return appid, self._mm[start:start + length].decode('utf-8', errors='ignore')
+
+    def get_name(self, appid: str | int) -> str | None:
+        """按 AppID 二分查找名称。"""
+        target = int(appid)
+        lo, hi = 0, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_appid = struct.unpack_from('<I', self._mm, self._records_at + mid * self.RECORD.size)[0]
+            if mid_appid < target: lo = mid + 1
+            elif mid_appid > target: hi = mid
+            else: return self._record(mid)[1]
+        return None
+
+    def _postings(self, gram_hash: int) -> Tuple[int, int] | None:
+        lo, hi = 0, self.gram_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_hash, offset, count = self.GRAM.unpack_from(self._mm, self._grams_at + mid * self.GRAM.size)
+            if mid_hash < gram_hash: lo = mid + 1
+            elif mid_hash > gram_hash: hi = mid
+            else: return offset, count
+        return None
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """二元组倒排检索 + 子串校验，按 完全匹配 > 前缀 > 词首 > 子串、再按名称长度排序。"""
+        normalized = self.normalize(query)
+        grams = self._grams(normalized)
+        if not grams:
+            return []
+        # 只展开最稀有的二元组，其余条件由子串校验保证
+        rarest = None
+        for gram in grams:
+            found = self._postings(self._gram_hash(gram))
+            if found is None:
+                return []
+            if rarest is None or found[1] < rarest[1]:
+                rarest = found
+        offset, count = rarest
+        candidates = struct.unpack_from(f'<{count}I', self._mm, self._postings_at + offset * 4)
+
+        ranked = []
+        for idx in candidates:
+            appid, name = self._record(idx)
+            name_norm = self.normalize(name)
+            pos = name_norm.find(normalized)
+            if pos == -1:
+                continue
+            if name_norm == normalized: rank = 0
+            elif pos == 0: rank = 1
+            elif name_norm[pos - 1] == ' ': rank = 2
+            else: rank = 3
+            ranked.append((rank, len(name_norm), appid, name))
+        return [
+            {'appid': str(appid), 'name': name, 'header_image': f'https://cdn.akamai.steamstatic.com/steam/apps/{appid}/header.jpg'}
+            for _, _, appid, name in heapq.nsmallest(limit, ranked)
+        ]
+
+
+_LOCAL_APP_INDEX: LocalAppIndex | None = None
+_LOCAL_APP_INDEX_LOCK = threading.Lock()
+
+def get_local_app_index(index_path: Path) -> LocalAppIndex | None:
+    """返回进程内共享的本地索引；索引文件不存在（未导入）时返回 None。"""
+    global _LOCAL_APP_INDEX
+    with _LOCAL_APP_INDEX_LOCK:
+        if _LOCAL_APP_INDEX is None and index_path.exists():
+            _LOCAL_APP_INDEX = LocalAppIndex(index_path)
+        return _LOCAL_APP_INDEX
+
+def import_local_app_index(source_path: Path, index_path: Path) -> int:
+    """从应用列表文件重建本地索引并替换当前已加载的索引，返回收录的应用数。"""
+    global _LOCAL_APP_INDEX
+    apps = LocalAppIndex.parse_app_list(source_path)
+    if not apps:
+        raise ValueError("应用列表文件中没有有效的 appid,name 条目。")
+    count, tmp_path = LocalAppIndex.build(apps, index_path)
+    with _LOCAL_APP_INDEX_LOCK:
+        # Windows 下被映射的文件无法替换，先释放旧索引
+        if _LOCAL_APP_INDEX is not None:
+            _LOCAL_APP_INDEX.close()
+            _LOCAL_APP_INDEX = None
+        os.replace(tmp_path, index_path)
+        _LOCAL_APP_INDEX = LocalAppIndex(index_path)
+    return count
+
+
+class LibraryScanIndex:
+    """入库管理的扫描索引：按 (路径, 大小, mtime_ns) 缓存每个文件的解析结果并持久化到磁盘，
+    重复扫描时只重新解析新增或有变化的文件。目录用 os.scandir 遍历，DirEntry 自带的 stat 信息
+    在 Windows 上无需额外的系统调用。"""
+
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            self.entries: Dict[str, list] = json.loads(index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def scan(self, directory: Path, suffix: str, parser: Callable[[Path], Any], changes: List[Dict] | None = None,
+             workers: int = 1) -> Dict[str, Any]:
+        """返回目录中以 suffix 结尾的文件 {文件名: 解析结果}，parser 只对新增或有变化的文件调用。
+        传入 changes 时，把与上次扫描相比新增 (added)、修改 (modified)、删除 (removed) 的文件追加到其中。
+        workers > 1 时用线程池并行解析。"""
+        results, seen, stale = {}, set(), []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                seen.add(entry.path)
+                with self.lock:
+                    cached = self.entries.get(entry.path)
+                if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    results[entry.name] = cached[2]
+                    continue
+                results[entry.name] = None  # 占位，保持目录遍历顺序
+                stale.append((entry.name, entry.path, stat.st_size, stat.st_mtime_ns, cached))
+
+        parsed_values = self._parse_many([Path(item[1]) for item in stale], parser, workers)
+        with self.lock:
+            for (name, path, size, mtime_ns, cached), parsed in zip(stale, parsed_values):
+                self.entries[path] = [size, mtime_ns, parsed]
+                results[name] = parsed
+                if changes is not None:
+                    changes.append({"filename": name, "change": "modified" if cached else "added", "value": parsed})
+            self.dirty = self.dirty or bool(stale)
+        # 清除该目录中已被删除的文件
+        directory_str = os.path.normpath(str(directory))
+        with self.lock:
+            removed = [path for path in self.entries
+                       if os.path.dirname(path) == directory_str and path.endswith(suffix) and path not in seen]
+            for path in removed:
+                if changes is not None:
+                    changes.append({"filename": os.path.basename(path), "change": "removed", "value": self.entries[path][2]})
+                del self.entries[path]
+            self.dirty = self.dirty or bool(removed)
+        return results
+
+    @staticmethod
+    def _parse_many(paths: List[Path], parser: Callable[[Path], Any], workers: int) -> List[Any]:
+        if workers <= 1 or len(paths) < PARALLEL_SCAN_MIN_FILES:
+            return [parser(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cai-scan') as executor:
+            return list(executor.map(parser, paths))
+
+    def mtime_ns(self, path: Path) -> int | None:
+        """返回索引中记录的文件 mtime_ns，文件未被扫描过时返回 None。"""
+        with self.lock:
+            cached = self.entries.get(str(path))
+        return cached[1] if cached else None
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries, ensure_ascii=False)
+            self.dirty = False
+        atomic_write_text(self.index_path, data)
+
+
+_LIBRARY_SCAN_INDEX: LibraryScanIndex | None = None
+_LIBRARY_SCAN_INDEX_LOCK = threading.Lock()
+
+def get_library_scan_index(index_path: Path) -> LibraryScanIndex:
+    """返回进程内共享的扫描索引，首次使用时从磁盘加载。"""
+    global _LIBRARY_SCAN_INDEX
+    with _LIBRARY_SCAN_INDEX_LOCK:
+        if _LIBRARY_SCAN_INDEX is None:
+            _LIBRARY_SCAN_INDEX = LibraryScanIndex(index_path)
+        return _LIBRARY_SCAN_INDEX
+
+class WrittenManifestRegistry:
+    """记录本工具写入过的清单文件路径并持久化到磁盘。清理无引用清单时只考虑这些文件，
+    Steam 自己为已拥有游戏下载的清单即使不被任何入库文件引用也不会被删除。"""
+
+    def __init__(self, registry_path: Path):
+        self.registry_path = registry_path
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            self.paths = set(json.loads(registry_path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            self.paths = set()
+
+    @staticmethod
+    def _key(path) -> str:
+        return os.path.normcase(os.path.abspath(str(path)))
+
+    def add(self, path: Path):
+        key = self._key(path)
+        with self.lock:
+            if key not in self.paths:
+                self.paths.add(key)
+                self.dirty = True
+
+    def discard(self, paths):
+        with self.lock:
+            for path in paths:
+                self.paths.discard(self._key(path))
+            self.dirty = True
+
+    def __contains__(self, path) -> bool:
+        with self.lock:
+            return self._key(path) in self.paths
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(sorted(self.paths), ensure_ascii=False)
+            self.dirty = False
+        atomic_write_text(self.registry_path, data)
+
+
+_WRITTEN_MANIFESTS: WrittenManifestRegistry | None = None
+
+def get_written_manifests(registry_path: Path) -> WrittenManifestRegistry:
+    """返回进程内共享的已写入清单记录，首次使用时从磁盘加载，退出时保存未写盘的变更。"""
+    global _WRITTEN_MANIFESTS
+    with _LIBRARY_SCAN_INDEX_LOCK:
+        if _WRITTEN_MANIFESTS is None:
+            _WRITTEN_MANIFESTS = WrittenManifestRegistry(registry_path)
+            atexit.register(_WRITTEN_MANIFESTS.save)
+        return _WRITTEN_MANIFESTS
+
+# 内置 ZIP 清单源的下载地址与显示名称
+ZIP_SOURCE_URLS = {
+    "printedwaste": "https://api.printedwaste.com/gfk/download/{app_id}",
+    "cysaw": "https://cysaw.top/uploads/{app_id}.zip",
+    "furcate": "https://furcate.eu/files/{app_id}.zip",
+    "walftech": "https://walftech.com/proxy.php?url=https%3A%2F%2Fsteamgames554.s3.us-east-1.amazonaws.com%2F{app_id}.zip",
+    "steamdatabase": "https://steamdatabase.s3.eu-north-1.amazonaws.com/{app_id}.zip",
+}
+ZIP_SOURCE_NAMES = {
+    "printedwaste": "SWA V2 (printedwaste)",
+    "cysaw": "Cysaw",
+    "furcate": "Furcate",
+    "walftech": "Walftech",
+    "steamdatabase": "SteamDatabase",
+    "steamautocracks_v2": "SteamAutoCracks/ManifestHub(2)"
+}
+# 自动选源时只提供密钥的源排在完整清单源之后
+KEY_ONLY_SOURCES = ("sudama", "steamautocracks_v2")
+SOURCE_PROBE_TIMEOUT = 10
+SOURCE_PROBE_NEGATIVE_TTL = 30 * 60
+
+class SourceProbeCache:
+    """ZIP 源探测的负缓存：确认某个下载地址不存在后，TTL 内不再请求它。
+    网络错误不会写入缓存，以免把临时故障当成缺失。"""
+
+    def __init__(self, ttl: float = SOURCE_PROBE_NEGATIVE_TTL):
+        self.ttl = ttl
+        self._missing: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def is_missing(self, url: str) -> bool:
+        with self._lock:
+            expires_at = self._missing.get(url)
+            if expires_at is None:
+                return False
+            if time.time() > expires_at:
+                del self._missing[url]
+                return False
+            return True
+
+    def mark_missing(self, url: str):
+        with self._lock:
+            self._missing[url] = time.time() + self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._missing.clear()
+
+
+SOURCE_PROBE_CACHE = SourceProbeCache()
+
+UPSTREAM_MANIFEST_TTL = 60 * 60
+
+class UpstreamManifestCache:
+    """AppID -> 上游公开分支 depot->manifest 映射的缓存，供自动刷新比对已入库游戏的清单版本。
+    查询不到 depot 的 AppID（例如 AppList 中的 depot ID）也缓存空结果，避免每轮重复请求。"""
+
+    def __init__(self, ttl: float = UPSTREAM_MANIFEST_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, app_id: str) -> Dict[str, str] | None:
+        with self._lock:
+            entry = self._entries.get(app_id)
+            if entry is None:
+                return None
+            if time.time() > entry[0]:
+                del self._entries[app_id]
+                return None
+            return entry[1]
+
+    def put(self, app_id: str, depot_manifest_map: Dict[str, str]):
+        with self._lock:
+            self._entries[app_id] = (time.time() + self.ttl, depot_manifest_map)
+
+
+UPSTREAM_MANIFEST_CACHE = UpstreamManifestCache()
+
+# 入库管理的游戏名称缓存，进程内所有 CaiBackend 实例共享，翻页和刷新时无需重复获取
+MANAGER_NAME_CACHE: Dict[str, str] = {}
+
+class DepotcacheIndex:
+    """depotcache 目录中清单文件的快照，每个目录只遍历一次，之后按 GID 查找 {depot}_{gid}.manifest 无需再 glob。
+    by_gid: GID -> [文件路径]；by_depot: depot_id -> {GID}；files: 每个清单的 (路径, depot_id, GID, 大小, mtime)。"""
+
+    def __init__(self, directories: List[Path]):
+        self.by_gid: Dict[str, List[Path]] = {}
+        self.by_depot: Dict[str, set] = {}
+        self.files: List[Tuple[Path, str, str, int, float]] = []
+        for directory in directories:
+            if not directory.exists(): continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.manifest') or not entry.is_file(): continue
+                    depot_id, _, gid = entry.name[:-len('.manifest')].partition('_')
+                    if depot_id.isdigit() and gid.isdigit():
+                        stat = entry.stat()
+                        path = Path(entry.path)
+                        self.by_gid.setdefault(gid, []).append(path)
+                        self.by_depot.setdefault(depot_id, set()).add(gid)
+                        self.files.append((path, depot_id, gid, stat.st_size, stat.st_mtime))
+
+    def files_for_gids(self, gids) -> List[Path]:
+        return [path for gid in dict.fromkeys(gids) for path in self.by_gid.get(gid, [])]
+
+    def unreferenced(self, referenced_gids: set, referenced_depots: set, older_than: float | None = None) -> List[Tuple[Path, str, str, int, float]]:
+        """既不属于被引用的 GID、也不属于被引用 depot 的清单；指定 older_than 时只返回修改时间早于它的文件。"""
+        return [item for item in self.files
+                if item[2] not in referenced_gids and item[1] not in referenced_depots
+                and (older_than is None or item[4] < older_than)]
+
+class RemoteZipUnsupported(Exception):
+    """服务器不支持 Range 请求或压缩包格式不受支持，调用方应回退为完整下载。"""
+
+class RemoteZip:
+    """通过 HTTP Range 请求读取远程 ZIP：先取文件尾部的 End Of Central Directory 与中央目录列出成员，
+    再按需下载单个成员，无需下载整个压缩包。不支持 ZIP64 与加密成员。"""
+    EOCD_SIGNATURE = b'PK\x05\x06'
+    EOCD_STRUCT = struct.Struct('<4s4H2IH')
+    CENTRAL_STRUCT = struct.Struct('<4s6H3I5H2I')
+    LOCAL_STRUCT = struct.Struct('<4s5H3I2H')
+    TAIL_SIZES = (8192, 65536 + 22)  # 先取较小的尾部，找不到 EOCD 再取 EOCD 加最长注释的长度
+    LOCAL_HEADER_SLACK = 1024  # 本地文件头的扩展字段长度可能与中央目录不同
+
+    def __init__(self, client: httpx.AsyncClient, url: str, timeout: float = 60):
+        self.client = client
+        self.url = url
+        self.timeout = timeout
+        self.members: Dict[str, Tuple[int, int, int, int]] = {}  # 名称 -> (压缩方式, 压缩大小, 标志位, 本地文件头偏移)
+        self.bytes_fetched = 0
+
+    async def _fetch_range(self, byte_range: str) -> Tuple[bytes, int | None]:
+        # 使用流式请求：服务器忽略 Range 返回 200 时直接断开，不会下载整个文件
+        async with self.client.stream('GET', self.url, headers={'Range': f'bytes={byte_range}'},
+                                      timeout=self.timeout, follow_redirects=True) as response:
+            if response.status_code != 206:
+                raise RemoteZipUnsupported(f"服务器不支持 Range 请求 (HTTP {response.status_code})")
+            data = await response.aread()
+        self.bytes_fetched += len(data)
+        return data, CaiBackend._total_size_from_headers(response.headers)
+
+    async def load(self) -> 'RemoteZip':
+        for tail_size in self.TAIL_SIZES:
+            tail, total_size = await self._fetch_range(f'-{tail_size}')
+            pos = tail.rfind(self.EOCD_SIGNATURE)
+            if pos >= 0 and len(tail) - pos >= self.EOCD_STRUCT.size:
+                break
+            if total_size is not None and len(tail) >= total_size:
+                break  # 已经取到整个文件
+        if pos < 0 or len(tail) - pos < self.EOCD_STRUCT.size:
+            raise RemoteZipUnsupported("未找到 ZIP 目录结尾记录")
+        _, _, _, _, entry_count, cd_size, cd_offset, _ = self.EOCD_STRUCT.unpack_from(tail, pos)
+        if entry_count == 0xFFFF or cd_offset == 0xFFFFFFFF:
+            raise RemoteZipUnsupported("不支持 ZIP64 压缩包")
+
+        tail_start = total_size - len(tail) if total_size else None
+        if tail_start is not None and cd_offset >= tail_start:
+            central = tail[cd_offset - tail_start:cd_offset - tail_start + cd_size]
+        else:
+            central, _ = await self._fetch_range(f'{cd_offset}-{cd_offset + cd_size - 1}')
+
+        offset = 0
+        for _ in range(entry_count):
+            fields = self.CENTRAL_STRUCT.unpack_from(central, offset)
+            if fields[0] != b'PK\x01\x02':
+                raise RemoteZipUnsupported("中央目录损坏")
+            flags, method, comp_size = fields[3], fields[4], fields[8]
+            name_len, extra_len, comment_len, local_offset = fields[10], fields[11], fields[12], fields[16]
+            start = offset + self.CENTRAL_STRUCT.size
+            name = central[start:start + name_len].decode('utf-8' if flags & 0x800 else 'cp437')
+            self.members[name] = (method, comp_size, flags, local_offset)
+            offset = start + name_len + extra_len + comment_len
+        return self
+
+    def names(self) -> List[str]:
+        return list(self.members)
+
+    async def read(self, name: str) -> bytes:
+        method, comp_size, flags, local_offset = self.members[name]
+        if flags & 0x1:
+            raise RemoteZipUnsupported(f"成员 {name} 已加密")
+        guess_end = local_offset + self.LOCAL_STRUCT.size + len(name.encode('utf-8')) + self.LOCAL_HEADER_SLACK + comp_size
+        data, _ = await self._fetch_range(f'{local_offset}-{guess_end - 1}')
+        fields = self.LOCAL_STRUCT.unpack_from(data, 0)
+        if fields[0] != b'PK\x03\x04':
+            raise RemoteZipUnsupported(f"成员 {name} 的本地文件头损坏")
+        start = self.LOCAL_STRUCT.size + fields[9] + fields[10]
+        if start + comp_size > len(data):
+            more, _ = await self._fetch_range(f'{local_offset + len(data)}-{local_offset + start + comp_size - 1}')
+            data += more
+        raw = data[start:start + comp_size]
+        if method == 0:
+            return raw
+        if method == 8:
+            return zlib.decompress(raw, -15)
+        raise RemoteZipUnsupported(f"不支持的压缩方式: {method}")
+
 class CaiBackend:
     def __init__(self):
         self.project_root = Path.cwd()
@@ -98,16 +823,60 @@ class CaiBackend:
         self.lock = asyncio.Lock()
         self.temp_path = self.project_root / 'temp'
         self.log = self._init_log()
-        self.name_cache: Dict[str, str] = {} # NEW: 添加游戏名称缓存
+        self.name_cache: Dict[str, str] = MANAGER_NAME_CACHE # 游戏名称缓存（进程内共享）
+        self._sudama_data: Dict | None = None
+        self._sudama_lock = asyncio.Lock()
+        self.created_files: List[Path] = []  # 本次任务新建的文件，任务被取消时删除
 
     async def __aenter__(self):
-        self.client = httpx.AsyncClient(verify=False, trust_env=True)
+        shared_client = SHARED_HTTP_CLIENT.get()
+        self._owns_client = shared_client is None
+        self.client = shared_client or new_shared_http_client()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client:
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            self.discard_created_files()
+        if _WRITTEN_MANIFESTS is not None and _WRITTEN_MANIFESTS.dirty:
+            await asyncio.to_thread(_WRITTEN_MANIFESTS.save)
+        if self.client and self._owns_client:
             await self.client.aclose()
 
+    def _track_new_file(self, path: Path):
+        """记录即将新建的文件（已存在的文件不记录，避免取消时误删用户原有文件）。
+        清单文件同时登记为本工具写入，覆盖已有文件时也登记。"""
+        if path.suffix == '.manifest':
+            self.get_written_manifests().add(path)
+        if not path.exists():
+            files = CREATED_FILES.get()
+            (files if files is not None else self.created_files).append(path)
+
+    def _record_step(self, step: str, detail: str = ''):
+        """向任务日志记录一个已完成的步骤（已写入的清单 manifest:文件名，批量任务中已完成的 app:AppID）。"""
+        recorder = JOB_STEP_RECORDER.get()
+        if recorder is not None:
+            try:
+                recorder(step, detail)
+            except Exception as e:
+                self.log.debug(f"记录任务步骤失败: {e}")
+
+    def _step_completed(self, step: str, path: Path) -> bool:
+        """恢复中断的任务时，该步骤在上次运行中已完成且产物文件仍然存在。"""
+        completed = JOB_COMPLETED_STEPS.get()
+        return bool(completed) and step in completed and path.exists()
+
+    def discard_created_files(self, files: List[Path] | None = None):
+        """任务被取消或超时：删除本次任务新建的、可能不完整的文件。"""
+        files = self.created_files if files is None else files
+        for path in files:
+            try:
+                if path.exists():
+                    path.unlink()
+                    self.log.warning(f"任务已取消，已删除未完成的文件: {path}")
+            except OSError as e:
+                self.log.warning(f"删除未完成的文件失败: {path} - {e}")
+        files.clear()
+
     def _init_log(self, level=logging.INFO) -> logging.Logger:
         logger = logging.getLogger(' Cai install')
         logger.setLevel(level)
@@ -130,18 +899,17 @@ class CaiBackend:
             if isinstance(handler, logging.StreamHandler):
                 handler.setLevel(level)
         self.log.debug(f"日志等级已设置为: {'DEBUG' if is_debug else 'INFO'}")
-        self.log.handlers = [h for h in self.log.handlers if not isinstance(h, logging.FileHandler)]
         if self.config.get("logging_files", True):
             logs_dir = self.project_root / 'logs'
             logs_dir.mkdir(exist_ok=True)
-            log_file_path = logs_dir / f'cai-install-gui-{time.strftime("%Y-%m-%d")}.log'
-            file_handler = logging.FileHandler(log_file_path, 'a', encoding='utf-8')
-            file_handler.setLevel(level)
-            file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-            file_handler.setFormatter(file_formatter)
-            self.log.addHandler(file_handler)
-            self.log.info(f"已启用文件日志，将保存到: {log_file_path}")
+            json_lines = bool(self.config.get("log_json_lines", False))
+            log_file_path = logs_dir / f'cai-install-gui-{time.strftime("%Y-%m-%d")}.{"jsonl" if json_lines else "log"}'
+            settings = (log_file_path, level, int(self.config.get("log_max_bytes", 10 * 1024 * 1024)),
+                        int(self.config.get("log_backup_count", 5)), json_lines)
+            if FILE_LOG_SERVICE.configure(self.log, settings):
+                self.log.info(f"已启用文件日志，将保存到: {log_file_path}")
         else:
+            FILE_LOG_SERVICE.configure(self.log, None)
             self.log.info("文件日志已禁用。")
 
     def _compare_versions(self, v1: str, v2: str) -> int:
@@ -385,6 +1153,14 @@ class CaiBackend:
             self.log.error(f'获取Steam路径失败。请检查Steam是否正确安装，或在config.json中设置Custom_Steam_Path。')
             return None
             
+    def get_local_index(self) -> LocalAppIndex | None:
+        """获取已导入的本地游戏名称索引，未导入或加载失败时返回 None。"""
+        try:
+            return get_local_app_index(self.project_root / LOCAL_APP_INDEX_FILENAME)
+        except Exception as e:
+            self.log.warning(f"加载本地游戏索引失败: {e}")
+            return None
+
     # --- NEW: File Manager Methods ---
 
     async def _fetch_game_name_for_manager(self, appid: str) -> str:
@@ -394,15 +1170,20 @@ class CaiBackend:
         if appid in self.name_cache:
             return self.name_cache[appid]
 
+        local_index = self.get_local_index()
+        if local_index:
+            local_name = local_index.get_name(appid)
+            if local_name:
+                self.name_cache[appid] = local_name
+                return local_name
+
         url = f"https://api.xiaoheihe.cn/game/share_game_detail?appid={appid}"
         try:
-            # 使用现有client
-            response = await self.client.get(url, headers={'User-Agent': 'Cai-Install-Manager/1.0'})
-            response.raise_for_status()
-            html_content = response.text
+            # 使用现有client，流式读取，<title> 位于页面开头，读到 </title> 即停止
+            html_content = await self._read_html_head(url, headers={'User-Agent': 'Cai-Install-Manager/1.0'})
             
             # 使用正则表达式从HTML中提取<title>标签的内容
-            title_match = re.search(r'<title>(.*?)</title>', html_content, re.IGNORECASE)
+            title_match = re.search(r'<title>(.*?)</title>', html_content, re.IGNORECASE | re.DOTALL)
             
             if title_match:
                 name = title_match.group(1).strip()
@@ -416,70 +1197,139 @@ class CaiBackend:
         except Exception as e:
             self.log.warning(f"从小黑盒获取 AppID {appid} 的名称失败: {e}")
             return "获取失败"
-            
-    async def get_managed_files(self) -> Dict:
-        """扫描所有相关目录，返回文件信息，并批量获取游戏名称。"""
+
+    async def _read_html_head(self, url: str, headers: Dict | None = None, max_bytes: int = TITLE_SCAN_MAX_BYTES) -> str:
+        """流式下载页面，读到 </title> 或达到 max_bytes 上限后立即断开，返回已读取的部分。"""
+        buffer = bytearray()
+        async with self.client.stream('GET', url, headers=headers) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                # 只需在新数据及其前面一小段重叠区域中查找结束标签
+                search_from = max(0, len(buffer) - len(b'</title>'))
+                buffer.extend(chunk)
+                if buffer.lower().find(b'</title>', search_from) != -1 or len(buffer) >= max_bytes:
+                    break
+            encoding = response.encoding or 'utf-8'
+        return bytes(buffer[:max_bytes]).decode(encoding, errors='ignore')
+            
+    async def get_managed_files(self, fetch_names: bool = True) -> Dict:
+        """扫描所有相关目录，返回文件信息。fetch_names 为 False 时只做本地扫描，
+        未缓存的名称保留占位符，并在 pending_names 中返回待获取的AppID。"""
         if not self.steam_path or not self.steam_path.exists():
             return {"error": "Steam路径未配置或无效。"}
 
         file_data = {"st": [], "gl": [], "assistant": []}
         all_appids_to_fetch = set()
 
-        # 1. 扫描文件并收集AppID
+        # 1. 扫描文件并收集AppID（目录遍历、解析与线程池等待都放到线程中，避免阻塞共享的工作事件循环）
         st_path = self.steam_path / 'config' / 'stplug-in'
         gl_path = self.steam_path / 'AppList'
 
         # SteamTools
         if st_path.exists():
-            file_data['st'], st_appids = self._scan_st_files(st_path)
+            file_data['st'], st_appids = await asyncio.to_thread(self._scan_st_files, st_path)
             all_appids_to_fetch.update(st_appids)
 
         # GreenLuma
         if gl_path.exists():
-            file_data['gl'], gl_appids = self._scan_generic_files(gl_path, ".txt")
+            file_data['gl'], gl_appids = await asyncio.to_thread(self._scan_generic_files, gl_path, ".txt")
             all_appids_to_fetch.update(gl_appids)
 
-        # 2. 批量获取游戏名称
-        # 过滤掉已在缓存中的AppID
-        appids_to_fetch = [appid for appid in all_appids_to_fetch if appid not in self.name_cache]
-        if appids_to_fetch:
-            tasks = [self._fetch_game_name_for_manager(appid) for appid in appids_to_fetch]
-            results = await asyncio.gather(*tasks)
-            for appid, name in zip(appids_to_fetch, results):
-                self.name_cache[appid] = name
+        # 2. 批量获取游戏名称（仅在需要时阻塞等待）
+        if fetch_names:
+            await self.resolve_game_names(all_appids_to_fetch)
+        else:
+            file_data['pending_names'] = sorted(
+                (appid for appid in all_appids_to_fetch if appid not in self.name_cache), key=int
+            )
 
-        # 3. 将获取到的名称填充回数据
-        for category in file_data:
+        # 3. 将已知的名称填充回数据
+        for category in ("st", "gl", "assistant"):
             for item in file_data[category]:
                 if item['appid'] in self.name_cache:
                     item['game_name'] = self.name_cache[item['appid']]
         
         return file_data
 
+    async def resolve_game_names(self, appids, on_resolved: Callable[[str, str], None] | None = None) -> Dict[str, str]:
+        """并发获取一批AppID的游戏名称，每完成一个就调用 on_resolved(appid, name)。"""
+        # 过滤掉已在缓存中的AppID
+        appids_to_fetch = [appid for appid in appids if appid not in self.name_cache]
+
+        async def _fetch(appid: str) -> Tuple[str, str]:
+            return appid, await self._fetch_game_name_for_manager(appid)
+
+        for next_done in asyncio.as_completed([_fetch(appid) for appid in appids_to_fetch]):
+            appid, name = await next_done
+            if name not in MANAGER_NAME_FAILURES:
+                self.name_cache[appid] = name
+            if on_resolved:
+                on_resolved(appid, name)
+
+        return {appid: self.name_cache[appid] for appid in appids if appid in self.name_cache}
+
+    def _library_mtime(self, directory: Path, filename: str) -> float | None:
+        """从扫描索引读取文件修改时间（秒），供入库管理按修改时间排序。"""
+        mtime_ns = self.get_library_scan_index().mtime_ns(directory / filename)
+        return mtime_ns / 1e9 if mtime_ns is not None else None
+
+    def get_library_scan_index(self) -> LibraryScanIndex:
+        return get_library_scan_index(self.project_root / LIBRARY_SCAN_INDEX_FILENAME)
+
+    def get_written_manifests(self) -> WrittenManifestRegistry:
+        return get_written_manifests(self.project_root / WRITTEN_MANIFESTS_FILENAME)
+
+    def scan_library_directory(self, directory: Path, suffix: str, parser: Callable[[Path], Any], changes: List[Dict] | None = None) -> Dict[str, Any]:
+        """通过扫描索引扫描一个入库目录，按配置的宽度并行解析有变化的文件。"""
+        scan_index = self.get_library_scan_index()
+        config = self.config or {}
+        parsed = scan_index.scan(directory, suffix, parser, changes,
+                                 workers=int(config.get("scan_workers", 8)))
+        scan_index.save()
+        return parsed
+
+    @staticmethod
+    def _parse_st_lua(path: Path) -> str | List[str] | None:
+        """普通 lua 返回第一个 addappid 的AppID；steamtools.lua 返回其中解锁的全部AppID。"""
+        content = path.read_text(encoding='utf-8', errors='ignore')
+        if path.name == "steamtools.lua":
+            # --- CRITICAL FIX: Use a more general regex to find all appids ---
+            return sorted(set(re.findall(r'addappid\s*\(\s*(\d+)', content)))
+        match = re.search(r'addappid\s*\(\s*(\d+)', content)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _parse_gl_txt(path: Path) -> str:
+        """GreenLuma 的 AppList 文件内容即为AppID，内容不是纯数字时使用文件名作为备用。"""
+        try:
+            content = path.read_text(encoding='utf-8', errors='ignore').strip()
+            return content if content.isdigit() else path.stem
+        except Exception as e:
+            logging.getLogger(' Cai install').warning(f"读取GreenLuma文件 {path.name} 失败: {e}")
+            return path.stem
+
     def _scan_st_files(self, directory: Path) -> Tuple[List[Dict], set]:
-        """扫描SteamTools目录，返回文件数据和AppID集合。"""
+        """扫描SteamTools目录，返回文件数据和AppID集合。只重新解析有变化的 lua 文件。"""
         data, appids = [], set()
         file_data_map = {}
         try:
-            for filename in os.listdir(directory):
-                if filename.endswith(".lua") and filename != "steamtools.lua":
-                    content = (directory / filename).read_text(encoding='utf-8', errors='ignore')
-                    match = re.search(r'addappid\s*\(\s*(\d+)', content)
-                    appid = match.group(1) if match else "N/A"
+            parsed = self.scan_library_directory(directory, ".lua", self._parse_st_lua)
+            for filename, appid in parsed.items():
+                if filename != "steamtools.lua":
+                    appid = appid or "N/A"
                     if appid.isdigit():
                         appids.add(appid)
-                        file_data_map[appid] = {"filename": filename, "appid": appid, "game_name": "加载中...", "status": "ok"}
-            
-            st_lua_path = directory / "steamtools.lua"
-            if st_lua_path.exists():
-                data.append({"filename": "steamtools.lua", "appid": "N/A", "game_name": "SteamTools核心文件", "status": "core_file"})
-                content = st_lua_path.read_text(encoding='utf-8', errors='ignore')
-                # --- CRITICAL FIX: Use a more general regex to find all appids ---
-                unlocked_appids = set(re.findall(r'addappid\s*\(\s*(\d+)', content))
+                        file_data_map[appid] = {"filename": filename, "appid": appid, "game_name": "加载中...", "status": "ok",
+                                                "mtime": self._library_mtime(directory, filename)}
+            
+            if "steamtools.lua" in parsed:
+                data.append({"filename": "steamtools.lua", "appid": "N/A", "game_name": "SteamTools核心文件", "status": "core_file",
+                             "mtime": self._library_mtime(directory, "steamtools.lua")})
+                unlocked_appids = parsed["steamtools.lua"]
                 for appid in unlocked_appids:
                     if appid not in file_data_map:
                         appids.add(appid)
-                        file_data_map[appid] = {"filename": f"缺少 {appid}.lua", "appid": appid, "game_name": "加载中...", "status": "unlocked_only"}
+                        file_data_map[appid] = {"filename": f"缺少 {appid}.lua", "appid": appid, "game_name": "加载中...", "status": "unlocked_only", "mtime": None}
         except Exception as e:
             self.log.error(f"扫描SteamTools目录失败: {e}")
         
@@ -490,31 +1340,17 @@ class CaiBackend:
         """扫描通用目录（如GreenLuma），返回文件数据和AppID集合。"""
         data, appids = [], set()
         try:
-            files = [f for f in os.listdir(directory) if f.endswith(extension)]
-            for filename in files:
-                file_path = directory / filename
-
-                # 对于GreenLuma，读取TXT文件内容获取AppID
-                if extension == ".txt":
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read().strip()
-                            # 尝试将文件内容解析为AppID
-                            if content.isdigit():
-                                appid = content
-                            else:
-                                # 如果内容不是纯数字，使用文件名作为备用
-                                appid = Path(filename).stem
-                    except Exception as e:
-                        self.log.warning(f"读取GreenLuma文件 {filename} 失败: {e}")
-                        appid = Path(filename).stem
-                else:
-                    # 对于其他文件类型，使用文件名
-                    appid = Path(filename).stem
-
+            if extension == ".txt":
+                # 对于GreenLuma，读取TXT文件内容获取AppID，只重新读取有变化的文件
+                parsed = self.scan_library_directory(directory, extension, self._parse_gl_txt)
+            else:
+                # 对于其他文件类型，使用文件名
+                parsed = {f: Path(f).stem for f in os.listdir(directory) if f.endswith(extension)}
+            for filename, appid in parsed.items():
                 if appid.isdigit():
                     appids.add(appid)
-                    data.append({"filename": filename, "appid": appid, "game_name": "加载中...", "status": "ok"})
+                    data.append({"filename": filename, "appid": appid, "game_name": "加载中...", "status": "ok",
+                                 "mtime": self._library_mtime(directory, filename)})
         except Exception as e:
             self.log.error(f"扫描目录 {directory} 失败: {e}")
 
@@ -523,7 +1359,9 @@ class CaiBackend:
         return data, appids
     
     def delete_managed_files(self, file_type: str, items: List[Dict]) -> Dict:
-        """根据类型和项目列表删除文件, 并清理关联的manifest。"""
+        """根据类型和项目列表批量删除文件, 并清理关联的manifest。
+        先汇总全部待删文件、待移除的解锁条目与清单 GID，steamtools.lua 只重写一次，
+        清单通过一次性建立的 depotcache 索引定位；steamtools.lua 写入失败时不删除任何文件。"""
         if not self.steam_path or not self.steam_path.exists():
             return {"success": False, "message": "Steam路径无效。"}
         
@@ -536,73 +1374,95 @@ class CaiBackend:
         if not base_path:
             return {"success": False, "message": f"未知的类型: {file_type}。"}
 
-        deleted_count, failed, manifests_deleted_count = 0, [], 0
-        
+        # 步骤1: 汇总待删除的文件、steamtools.lua 中待移除的AppID，以及 lua 中固定的清单 GID
+        appids_to_unlock, files_to_delete, gids, failed = set(), [], [], []
         for item in items:
+            label = item.get('filename', item.get('appid'))
+            if file_type == 'st' and item.get('status') != 'core_file' and item.get('appid', 'N/A').isdigit():
+                appids_to_unlock.add(item['appid'])
+            filename = item.get('filename')
+            if not filename or "缺少" in filename:
+                continue
+            file_path = base_path / filename
+            if not file_path.is_file():
+                continue
+            if file_type == 'st' and filename.endswith('.lua'):
+                try:
+                    content = file_path.read_text(encoding='utf-8', errors='ignore')
+                    gids.extend(re.findall(r'setManifestid\s*\(\s*\d+\s*,\s*"(\d+)"\s*\)', content))
+                except Exception as e:
+                    self.log.error(f"读取 {filename} 的清单信息时失败: {e}")
+            files_to_delete.append((label, file_path))
+
+        # 步骤2: 一次性重写 steamtools.lua
+        unlock_entries_removed = 0
+        if appids_to_unlock:
             try:
-                # 步骤1: 如果是ST类型，清理 steamtools.lua 中的解锁条目
-                if file_type == 'st' and item.get('status') != 'core_file' and item.get('appid', 'N/A').isdigit():
-                    self._modify_st_lua_for_delete(item['appid'])
-
-                # 步骤2: 清理物理文件和关联的 manifest
-                filename = item.get('filename')
-                if filename and "缺少" not in filename:
-                    file_path = base_path / filename
-                    if file_path.exists() and file_path.is_file():
-                        # --- NEW: Logic to clean up associated manifest files ---
-                        if file_type == 'st' and filename.endswith('.lua'):
-                            try:
-                                content = file_path.read_text(encoding='utf-8', errors='ignore')
-                                gids = re.findall(r'setManifestid\s*\(\s*\d+\s*,\s*"(\d+)"\s*\)', content)
-                                depotcache_paths = [
-                                    self.steam_path / 'depotcache',
-                                    self.steam_path / 'config' / 'depotcache'
-                                ]
-                                for gid in gids:
-                                    for cache_path in depotcache_paths:
-                                        if cache_path.exists():
-                                            for mf in cache_path.glob(f'*_{gid}.manifest'):
-                                                if mf.exists():
-                                                    os.remove(mf)
-                                                    manifests_deleted_count += 1
-                            except Exception as e:
-                                self.log.error(f"清理 {filename} 的清单时失败: {e}")
-                        
-                        # 删除主文件
-                        os.remove(file_path)
-                        deleted_count += 1
+                unlock_entries_removed = self._modify_st_lua_for_delete(appids_to_unlock)
+            except Exception as e:
+                return {"success": False, "message": f"修改 steamtools.lua 失败，未删除任何文件: {e}"}
+
+        # 步骤3: 按预先建立的索引删除关联清单，再删除主文件
+        manifests_deleted_count = 0
+        if gids:
+            depotcache_index = self.build_depotcache_index()
+            for manifest_path in depotcache_index.files_for_gids(gids):
+                try:
+                    os.remove(manifest_path)
+                    manifests_deleted_count += 1
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    self.log.error(f"删除清单 {manifest_path.name} 失败: {e}")
+
+        deleted_count = 0
+        for label, file_path in files_to_delete:
+            try:
+                os.remove(file_path)
+                deleted_count += 1
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                failed.append(f"{item.get('filename', item.get('appid'))}: {e}")
+                failed.append(f"{label}: {e}")
 
         message = f"成功处理 {len(items) - len(failed)}/{len(items)} 个条目。"
         if deleted_count > 0:
             message += f" 删除了 {deleted_count} 个文件。"
+        if unlock_entries_removed > 0:
+            message += f" 移除了 {unlock_entries_removed} 个解锁条目。"
         if manifests_deleted_count > 0:
              message += f" 清理了 {manifests_deleted_count} 个关联清单文件。"
         if failed:
             message += f" 失败条目: {', '.join(failed)}"
         
-        return {"success": not failed, "message": message}
+        return {"success": not failed, "message": message,
+                "summary": {"items": len(items), "files_deleted": deleted_count, "unlock_entries_removed": unlock_entries_removed,
+                            "manifests_deleted": manifests_deleted_count, "failed": failed}}
 
 
-    def _modify_st_lua_for_delete(self, appid: str):
-        """从steamtools.lua中移除一个解锁条目。"""
+    def _modify_st_lua_for_delete(self, appids: set) -> int:
+        """从steamtools.lua中一次性移除一批解锁条目，返回移除的行数。"""
         st_lua_path = self.steam_path / 'config' / 'stplug-in' / "steamtools.lua"
-        if not st_lua_path.exists(): return
+        if not st_lua_path.exists(): return 0
 
         try:
             content = st_lua_path.read_text(encoding='utf-8', errors='ignore')
-            # 匹配 addappid(XXX, 1) 或 addappid(XXX) 两种形式
-            pattern = re.compile(r'^\s*addappid\s*\(\s*' + re.escape(appid) + r'[^)]*\)\s*$', re.MULTILINE)
-            new_content, count = pattern.subn('', content)
-            
+            # 匹配 addappid(XXX, 1) 或 addappid(XXX) 两种形式，AppID 需完整匹配
+            pattern = re.compile(r'^\s*addappid\s*\(\s*(\d+)[^)]*\)\s*$')
+            kept, count = [], 0
+            for line in content.splitlines():
+                match = pattern.match(line)
+                if match and match.group(1) in appids:
+                    count += 1
+                elif line.strip():  # 顺带清理空行
+                    kept.append(line)
+
             if count > 0:
-                # 清理空行
-                new_content_cleaned = "\n".join(line for line in new_content.splitlines() if line.strip())
-                st_lua_path.write_text(new_content_cleaned + "\n" if new_content_cleaned else "", encoding='utf-8')
-                self.log.info(f"已从 steamtools.lua 移除 AppID {appid} 的解锁条目。")
+                atomic_write_text(st_lua_path, "\n".join(kept) + "\n" if kept else "")
+                self.log.info(f"已从 steamtools.lua 移除 {count} 个解锁条目。")
+            return count
         except Exception as e:
-            self.log.error(f"修改 steamtools.lua 以删除 AppID {appid} 时失败: {e}")
+            self.log.error(f"修改 steamtools.lua 以删除解锁条目时失败: {e}")
             raise # 重新抛出异常，让上层捕获
             
     # --- END OF File Manager Methods ---
@@ -1132,6 +1992,14 @@ class CaiBackend:
             return False # 错误已在 get_workshop_depot_info 中记录
         
         consumer_app_id, hcontent_file, title = details
+
+        # 恢复中断的任务时，已保存到所有目标目录的清单不再重复下载
+        output_filename = f"{consumer_app_id}_{hcontent_file}.manifest"
+        targets = ([self.steam_path / 'config' / 'depotcache'] if copy_to_config else []) + \
+                  ([self.steam_path / 'depotcache'] if copy_to_depot else [])
+        if targets and all((target / output_filename).exists() for target in targets):
+            self.log.info(f"创意工坊清单 {output_filename} 已存在，跳过下载。")
+            return True
         
         # Download manifest using new method
         manifest_content = await self.download_workshop_manifest(consumer_app_id, hcontent_file)
@@ -1149,6 +2017,7 @@ class CaiBackend:
                 config_depot_path = self.steam_path / 'config' / 'depotcache'
                 config_depot_path.mkdir(parents=True, exist_ok=True)
                 config_file_path = config_depot_path / output_filename
+                self._track_new_file(config_file_path)
                 async with aiofiles.open(config_file_path, 'wb') as f:
                     await f.write(manifest_content)
                 self.log.info(f"清单文件已保存到: {config_file_path}")
@@ -1158,12 +2027,14 @@ class CaiBackend:
                 depot_cache_path = self.steam_path / 'depotcache'
                 depot_cache_path.mkdir(parents=True, exist_ok=True)
                 depot_file_path = depot_cache_path / output_filename
+                self._track_new_file(depot_file_path)
                 async with aiofiles.open(depot_file_path, 'wb') as f:
                     await f.write(manifest_content)
                 self.log.info(f"清单文件已保存到: {depot_file_path}")
                 success_count += 1
             
             if success_count > 0:
+                self._record_step(f"manifest:{output_filename}", title)
                 self.log.info(f"创意工坊清单 {output_filename} 处理完成。标题: {title}")
                 return True
             else:
@@ -1206,6 +2077,15 @@ class CaiBackend:
         
         return backup_token
 
+    def _manifest_target_dirs(self) -> List[Path]:
+        """不求人库清单的保存目录：SteamTools 同时保存到 config/depotcache 与 depotcache。"""
+        if self.unlocker_type == "steamtools":
+            return [self.steam_path / 'config' / 'depotcache', self.steam_path / 'depotcache']
+        return [self.steam_path / 'depotcache']
+
+    def _incremental_update_enabled(self) -> bool:
+        return bool((self.config or {}).get("incremental_update", True))
+
     async def _download_manifest_buqiuren(self, depot_id: str, manifest_id: str, depot_name: str) -> bool:
         """使用不求人接口下载清单"""
         output_filename = f"{depot_id}_{manifest_id}.manifest"
@@ -1330,18 +2210,22 @@ class CaiBackend:
                     st_depot_path.mkdir(parents=True, exist_ok=True)
                     gl_depot_path.mkdir(parents=True, exist_ok=True)
                     
-                    (st_depot_path / output_filename).write_bytes(final_content)
+                    self._track_new_file(st_depot_path / output_filename)
+                    await asyncio.to_thread((st_depot_path / output_filename).write_bytes, final_content)
                     self.log.info(f"清单已保存到: {st_depot_path / output_filename}")
                     
-                    (gl_depot_path / output_filename).write_bytes(final_content)
+                    self._track_new_file(gl_depot_path / output_filename)
+                    await asyncio.to_thread((gl_depot_path / output_filename).write_bytes, final_content)
                     self.log.info(f"清单已保存到: {gl_depot_path / output_filename}")
                 else:
                     # GreenLuma
                     depot_path = self.steam_path / 'depotcache'
                     depot_path.mkdir(parents=True, exist_ok=True)
-                    (depot_path / output_filename).write_bytes(final_content)
+                    self._track_new_file(depot_path / output_filename)
+                    await asyncio.to_thread((depot_path / output_filename).write_bytes, final_content)
                     self.log.info(f"清单已保存到: {depot_path / output_filename}")
                 
+                self._record_step(f"manifest:{output_filename}", depot_name)
                 self.log.info(f"成功下载清单: {depot_name} ({output_filename})")
                 return True
                 
@@ -1356,6 +2240,13 @@ class CaiBackend:
         return False
 
     async def _get_cached_sudama_data(self) -> Dict:
+        """获取 Sudama 密钥数据，同一实例内只加载一次（批量任务中所有 AppID 共用）。"""
+        async with self._sudama_lock:
+            if self._sudama_data is None:
+                self._sudama_data = await self._load_sudama_data()
+            return self._sudama_data
+
+    async def _load_sudama_data(self) -> Dict:
         """
         核心函数：获取 Sudama 密钥数据
         逻辑：检查本地 sudama_cache.json -> 检查时间戳是否超过24小时 -> 下载或读取缓存
@@ -1491,6 +2382,13 @@ class CaiBackend:
             for i, (depot_id, manifest_id) in enumerate(depot_manifest_map.items(), 1):
                 self.log.info(f"处理进度: {i}/{total_count}")
                 depot_name = f"Depot {depot_id}"
+
+                # 已在磁盘上的清单（例如中断前已下载）直接跳过，也不需要等待
+                output_filename = f"{depot_id}_{manifest_id}.manifest"
+                if all((path / output_filename).exists() for path in self._manifest_target_dirs()):
+                    self.log.info(f"清单 {output_filename} 已存在，跳过下载。")
+                    success_count += 1
+                    continue
                 
                 # 使用不求人接口下载
                 if await self._download_manifest_buqiuren(depot_id, manifest_id, depot_name):
@@ -1695,6 +2593,180 @@ class CaiBackend:
         # 2. 如果主API失败，调用备用API
         return await self._get_depots_and_manifests_from_ddxnb(app_id)
 
+    # --- 自动刷新：比对已入库游戏与上游的清单版本 ---
+    def build_depotcache_index(self) -> DepotcacheIndex:
+        return DepotcacheIndex([self.steam_path / 'depotcache', self.steam_path / 'config' / 'depotcache'])
+
+    def _scan_depotcache_manifests(self) -> Dict[str, set]:
+        """depotcache 中已有的清单：depot_id -> {manifest_gid}。"""
+        return self.build_depotcache_index().by_depot
+
+    def _referenced_manifests(self) -> Tuple[set, set]:
+        """仍被引用的清单，返回 (GID 集合, depot_id 集合)。
+        SteamTools: stplug-in/*.lua 中的 setManifestid，注释掉的行也算引用（SteamTools 自动更新时仍可能用到）；
+        任何 addappid 中出现的 ID（带不带密钥都算），其下全部清单都视为被引用（自动更新模式下没有固定的 GID；
+        创意工坊清单以 {消费者AppID}_{hcontent}.manifest 命名，也由此匹配）；
+        GreenLuma: AppList 中列出的 depot，其下全部清单都视为被引用。"""
+        gids, depots = set(), set()
+        st_path = self.steam_path / 'config' / 'stplug-in'
+        if st_path.exists():
+            set_manifest_pattern = re.compile(r'setManifestid\s*\(\s*\d+\s*,\s*"(\d+)"')
+            addappid_pattern = re.compile(r'addappid\s*\(\s*(\d+)')
+            for lua_path in st_path.glob('*.lua'):
+                content = lua_path.read_text(encoding='utf-8', errors='ignore')
+                gids.update(set_manifest_pattern.findall(content))
+                depots.update(addappid_pattern.findall(content))
+        gl_path = self.steam_path / 'AppList'
+        if gl_path.exists():
+            _, gl_depots = self._scan_generic_files(gl_path, ".txt")
+            depots.update(gl_depots)
+        return gids, depots
+
+    def collect_depotcache_garbage(self, dry_run: bool = True, min_age_hours: float = DEPOTCACHE_GC_MIN_AGE_HOURS) -> Dict:
+        """找出 depotcache 与 config/depotcache 中由本工具写入、且不再被任何入库文件引用的清单，dry_run 为 False 时删除它们。
+        不是本工具写入的清单（Steam 为已拥有游戏下载的清单等）一律保留。"""
+        if not self.steam_path or not self.steam_path.exists():
+            return {"success": False, "message": "Steam路径无效。"}
+        index = self.build_depotcache_index()
+        referenced_gids, referenced_depots = self._referenced_manifests()
+        # min_age_hours 为 0 时以当前时间为界，仍排除修改时间晚于现在的文件，而不是关闭时间过滤
+        older_than = time.time() - max(0.0, min_age_hours) * 3600
+        written = self.get_written_manifests()
+        orphans = [item for item in index.unreferenced(referenced_gids, referenced_depots, older_than) if item[0] in written]
+
+        removed_count, removed_bytes, failed = 0, 0, []
+        if not dry_run:
+            for path, _, _, size, _ in orphans:
+                try:
+                    os.remove(path)
+                    removed_count += 1
+                    removed_bytes += size
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    failed.append(f"{path.name}: {e}")
+            written.discard(path for path, *_ in orphans if not path.exists())
+            written.save()
+            self.log.info(f"已清理 {removed_count} 个无引用清单，释放 {removed_bytes / 1024 / 1024:.1f} MB。")
+
+        orphan_bytes = sum(item[3] for item in orphans)
+        if dry_run:
+            message = f"发现 {len(orphans)} 个无引用清单，共 {orphan_bytes / 1024 / 1024:.1f} MB。"
+        else:
+            message = f"已删除 {removed_count}/{len(orphans)} 个无引用清单，释放 {removed_bytes / 1024 / 1024:.1f} MB。"
+        if failed:
+            message += f" 失败: {', '.join(failed)}"
+        return {
+            "success": not failed, "message": message, "dry_run": dry_run,
+            "total_files": len(index.files), "total_bytes": sum(item[3] for item in index.files),
+            "orphan_count": len(orphans), "orphan_bytes": orphan_bytes,
+            "removed_count": removed_count, "removed_bytes": removed_bytes,
+            "orphans": [{"filename": path.name, "directory": path.parent.relative_to(self.steam_path).as_posix(),
+                         "depot_id": depot_id, "gid": gid, "size": size} for path, depot_id, gid, size, _ in orphans],
+        }
+
+    def scan_installed_manifests(self) -> Dict[str, Dict]:
+        """扫描已入库的游戏及其本地清单版本，返回 {app_id: {"tool": "st"|"gl", "manifests": {depot_id: {gid}}}}。
+        SteamTools 读取 stplug-in/*.lua 中固定的 setManifestid（注释掉的行表示交由 SteamTools 自动更新，不参与比对）；
+        GreenLuma 读取 AppList 条目，本地版本取自 depotcache。"""
+        installed: Dict[str, Dict] = {}
+        if not self.steam_path or not self.steam_path.exists():
+            return installed
+        set_manifest_pattern = re.compile(r'^\s*setManifestid\s*\(\s*(\d+)\s*,\s*"(\d+)"', re.MULTILINE)
+
+        st_path = self.steam_path / 'config' / 'stplug-in'
+        if st_path.exists():
+            for lua_path in st_path.glob('*.lua'):
+                if lua_path.name == 'steamtools.lua' or not lua_path.stem.isdigit(): continue
+                content = lua_path.read_text(encoding='utf-8', errors='ignore')
+                manifests: Dict[str, set] = {}
+                for depot_id, gid in set_manifest_pattern.findall(content):
+                    manifests.setdefault(depot_id, set()).add(gid)
+                if manifests:
+                    installed[lua_path.stem] = {"tool": "st", "manifests": manifests}
+
+        gl_path = self.steam_path / 'AppList'
+        if gl_path.exists():
+            depotcache = self._scan_depotcache_manifests()
+            _, gl_appids = self._scan_generic_files(gl_path, ".txt")
+            for app_id in gl_appids:
+                if app_id not in installed and depotcache:
+                    installed[app_id] = {"tool": "gl", "manifests": depotcache}
+        return installed
+
+    async def get_upstream_manifests(self, app_id: str, use_cache: bool = True) -> Dict[str, str]:
+        """上游公开分支的 depot->manifest 映射，优先使用 UPSTREAM_MANIFEST_CACHE。"""
+        if use_cache:
+            cached = UPSTREAM_MANIFEST_CACHE.get(app_id)
+            if cached is not None:
+                return cached
+        depot_manifest_map = {str(depot_id): str(gid) for depot_id, gid in
+                              (await self._get_depots_and_manifests_from_steamui(app_id)).items()}
+        UPSTREAM_MANIFEST_CACHE.put(app_id, depot_manifest_map)
+        return depot_manifest_map
+
+    async def find_outdated_apps(self, concurrency: int = 4) -> List[Dict]:
+        """找出上游公开清单已更新的已入库游戏。只比对本地已有清单的 depot，
+        返回 [{"app_id", "tool", "changed_depots": {depot_id: 新 manifest_gid}}]。"""
+        installed = await asyncio.to_thread(self.scan_installed_manifests)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _check(app_id: str, entry: Dict) -> Dict | None:
+            async with semaphore:
+                try:
+                    upstream = await self.get_upstream_manifests(app_id)
+                except Exception as e:
+                    self.log.warning(f"获取 AppID {app_id} 的上游清单信息失败: {e}")
+                    return None
+            changed = {depot_id: gid for depot_id, gid in upstream.items()
+                       if depot_id in entry["manifests"] and gid not in entry["manifests"][depot_id]}
+            if not changed:
+                return None
+            return {"app_id": app_id, "tool": entry["tool"], "changed_depots": changed}
+
+        results = await asyncio.gather(*(_check(app_id, entry) for app_id, entry in installed.items()))
+        outdated = sorted((result for result in results if result), key=lambda result: int(result["app_id"]))
+        self.log.info(f"已检查 {len(installed)} 个已入库游戏，{len(outdated)} 个游戏的清单有更新。")
+        return outdated
+
+    async def refresh_outdated_app(self, app_id: str, tool: str, changed_depots: Dict[str, str]) -> bool:
+        """只更新清单有变化的部分，不改动用户原有的解锁配置（DLC、密钥、自动更新模式、来源）：
+        SteamTools 只替换 {app_id}.lua 中对应 depot 的 setManifestid 行；GreenLuma 只把新版本清单下载到 depotcache。"""
+        if tool == "st":
+            return await asyncio.to_thread(self._update_st_manifest_ids, app_id, changed_depots)
+        succeeded, downloaded = 0, 0
+        for depot_id, gid in changed_depots.items():
+            if (self.steam_path / 'depotcache' / f"{depot_id}_{gid}.manifest").exists():
+                succeeded += 1
+                continue
+            if downloaded:
+                await asyncio.sleep(random.uniform(10, 20))  # 与不求人库下载相同的间隔，避免频率限制
+            downloaded += 1
+            if await self._download_manifest_buqiuren(depot_id, gid, f"Depot {depot_id}"):
+                succeeded += 1
+        self.log.info(f"AppID {app_id}: 已更新 {succeeded}/{len(changed_depots)} 个 depot 的清单。")
+        return succeeded == len(changed_depots)
+
+    def _update_st_manifest_ids(self, app_id: str, changed_depots: Dict[str, str]) -> bool:
+        """就地替换 lua 中固定版本的 setManifestid 行，注释掉的行（交由 SteamTools 自动更新）保持不变。"""
+        lua_path = self.steam_path / 'config' / 'stplug-in' / f"{app_id}.lua"
+        if not lua_path.exists():
+            self.log.warning(f"未找到 {lua_path.name}，跳过刷新。")
+            return False
+        content = lua_path.read_text(encoding='utf-8', errors='ignore')
+        replaced = []
+        def _replace(match):
+            depot_id = match.group(2)
+            if depot_id not in changed_depots:
+                return match.group(0)
+            replaced.append(depot_id)
+            return f'{match.group(1)}{changed_depots[depot_id]}{match.group(4)}'
+        new_content = re.sub(r'^(\s*setManifestid\s*\(\s*(\d+)\s*,\s*")(\d+)(")', _replace, content, flags=re.MULTILINE)
+        if replaced:
+            atomic_write_text(lua_path, new_content)
+            self.log.info(f"已更新 {lua_path.name} 中 {len(replaced)} 个 depot 的清单版本: {', '.join(replaced)}")
+        return bool(replaced)
+
     async def _process_steamautocracks_v2_for_steamtools(self, app_id: str, valid_depots: Dict[str, str], depot_manifest_map: Dict[str, str], use_st_auto_update: bool, add_all_dlc: bool, patch_depot_key: bool, depotkeys_data: Dict) -> bool:
         """为 SteamTools 处理 SteamAutoCracks/ManifestHub(2) 清单"""
         try:
@@ -1732,6 +2804,7 @@ class CaiBackend:
                         self.log.info(f"添加 manifest 映射（固定版本）: depot {depot_id} -> manifest {manifest_id}")
             
             # 写入文件
+            self._track_new_file(lua_filepath)
             async with aiofiles.open(lua_filepath, mode="w", encoding="utf-8") as lua_file:
                 await lua_file.write('\n'.join(lines) + '\n')
                 if manifest_lines:
@@ -1982,7 +3055,23 @@ class CaiBackend:
             self.log.error(f"解析lua文件 {lua_file_path} 出错: {e}")
         return depots
 
+    @contextlib.asynccontextmanager
+    async def _steam_config_lock(self):
+        """跨线程/事件循环的全局文件写锁，等待时不阻塞当前事件循环。
+        写入方分布在多个工作事件循环上，不能用 asyncio.Lock；这里以非阻塞方式轮询获取，
+        等待期间任务被取消或超时也不会留下被占用的锁。"""
+        while not STEAM_CONFIG_LOCK.acquire(blocking=False):
+            await asyncio.sleep(STEAM_CONFIG_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            STEAM_CONFIG_LOCK.release()
+
     async def depotkey_merge(self, config_path: Path, depots_config: dict) -> bool:
+        async with self._steam_config_lock():
+            return await self._depotkey_merge_locked(config_path, depots_config)
+
+    async def _depotkey_merge_locked(self, config_path: Path, depots_config: dict) -> bool:
         if not config_path.exists():
             self.log.error('未找到Steam默认配置文件，您可能尚未登录。')
             return False
@@ -1995,7 +3084,11 @@ class CaiBackend:
                 self.log.error('找不到Steam配置节。')
                 return False
             depots = steam.setdefault('depots', {})
-            depots.update(depots_config.get('depots', {}))
+            new_depots = depots_config.get('depots', {})
+            if all(depots.get(depot_id) == info for depot_id, info in new_depots.items()):
+                self.log.info('config.vdf 中的密钥均已存在，无需写入。')
+                return True
+            depots.update(new_depots)
             async with aiofiles.open(config_path, mode='w', encoding='utf-8') as f:
                 await f.write(vdf.dumps(config_vdf, pretty=True))
             self.log.info('成功将密钥合并到config.vdf。')
@@ -2020,6 +3113,10 @@ class CaiBackend:
         raise Exception(f'尝试所有镜像后仍无法下载文件: {path}')
 
     async def greenluma_add(self, depot_id_list: list) -> bool:
+        async with self._steam_config_lock():
+            return self._greenluma_add_locked(depot_id_list)
+
+    def _greenluma_add_locked(self, depot_id_list: list) -> bool:
         app_list_path = self.steam_path / 'AppList'
         try:
             for file in app_list_path.glob('*.txt'): file.unlink(missing_ok=True)
@@ -2124,23 +3221,34 @@ class CaiBackend:
         try:
             self.temp_path.mkdir(exist_ok=True, parents=True)
             self.log.info(f'正从 {source_name} 下载 AppID {app_id} 的清单...')
-            response = await self.client.get(download_url, timeout=60)
-            response.raise_for_status()
-            async with aiofiles.open(zip_path, 'wb') as f: await f.write(response.content)
-            self.log.info('正在解压...')
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref: zip_ref.extractall(extract_path)
+            remote_manifest_names = None
+            steam_depot_path = self.steam_path / 'depotcache'
+            if unlocker_type == "steamtools":
+                # SteamTools 只需要密钥文件和清单文件名，不需要清单内容
+                remote_manifest_names = await self._fetch_zip_key_files_remote(download_url, extract_path)
+            elif self._incremental_update_enabled():
+                # 增量更新：只下载 depotcache 中还没有的清单
+                remote_manifest_names = await self._fetch_zip_key_files_remote(download_url, extract_path, manifest_dir=steam_depot_path)
+            if remote_manifest_names is None:
+                response = await self.client.get(download_url, timeout=60)
+                response.raise_for_status()
+                async with aiofiles.open(zip_path, 'wb') as f: await f.write(response.content)
+                self.log.info('正在解压...')
+                # 解压与文件复制都放到线程中执行，避免阻塞同一事件循环上的其他任务
+                await asyncio.to_thread(self._extract_zip, zip_path, extract_path)
             
             st_files = list(extract_path.glob('*.st'))
             if st_files:
                 st_converter = STConverter()
                 for st_file in st_files:
                     try:
-                        lua_content = st_converter.convert_file(str(st_file))
-                        (st_file.with_suffix('.lua')).write_text(lua_content, encoding='utf-8')
+                        lua_content = await asyncio.to_thread(st_converter.convert_file, str(st_file))
+                        await asyncio.to_thread((st_file.with_suffix('.lua')).write_text, lua_content, encoding='utf-8')
                         self.log.info(f'已转换 {st_file.name} -> {st_file.with_suffix(".lua").name}')
                     except Exception as e: self.log.error(f'转换 .st 文件 {st_file.name} 失败: {e}')
 
             manifest_files = list(extract_path.glob('*.manifest'))
+            manifest_names = remote_manifest_names if remote_manifest_names is not None else [f.name for f in manifest_files]
             lua_files = list(extract_path.glob('*.lua'))
             
             if unlocker_type == "steamtools":
@@ -2154,13 +3262,14 @@ class CaiBackend:
 
                 lua_filename = f"{app_id}.lua"
                 lua_filepath = stplug_path / lua_filename
+                self._track_new_file(lua_filepath)
                 async with aiofiles.open(lua_filepath, mode="w", encoding="utf-8") as lua_file:
                     await lua_file.write(f'addappid({app_id})\n')
                     for depot_id, info in all_depots.items():
                         await lua_file.write(f'addappid({depot_id}, 1, "{info["DecryptionKey"]}")\n')
 
-                    for manifest_f in manifest_files:
-                        match = re.search(r'(\d+)_(\w+)\.manifest', manifest_f.name)
+                    for manifest_name in manifest_names:
+                        match = re.search(r'(\d+)_(\w+)\.manifest', manifest_name)
                         if match:
                             line = f'setManifestid({match.group(1)}, "{match.group(2)}")\n'
                             if use_st_auto_update: await lua_file.write('--' + line)
@@ -2177,14 +3286,24 @@ class CaiBackend:
 
             else:
                 self.log.info(f'检测到 GreenLuma/标准模式，将处理来自 {source_name} 的文件。')
-                if not manifest_files:
+                if not manifest_names:
                     self.log.warning(f"在来自 {source_name} 的压缩包中未找到 .manifest 文件。")
                     return False
 
-                steam_depot_path = self.steam_path / 'depotcache'
+                incremental = self._incremental_update_enabled()
+                unchanged = 0
                 for f in manifest_files:
-                    shutil.copy2(f, steam_depot_path / f.name)
+                    # 清单文件名包含 manifest gid，同名即同一版本；恢复的任务中上次已写入的清单同样跳过
+                    if (incremental and (steam_depot_path / f.name).exists()) or self._step_completed(f"manifest:{f.name}", steam_depot_path / f.name):
+                        unchanged += 1
+                        continue
+                    self._track_new_file(steam_depot_path / f.name)
+                    await asyncio.to_thread(shutil.copy2, f, steam_depot_path / f.name)
+                    self._record_step(f"manifest:{f.name}")
                     self.log.info(f'已复制清单: {f.name}')
+                unchanged += len(manifest_names) - len(manifest_files)
+                if unchanged:
+                    self.log.info(f"增量更新: {unchanged}/{len(manifest_names)} 个清单已是最新，未重复下载。")
                 
                 all_depots = {}
                 for lua in lua_files:
@@ -2200,28 +3319,35 @@ class CaiBackend:
             return False
         finally:
             if zip_path.exists(): zip_path.unlink(missing_ok=True)
-            if extract_path.exists(): shutil.rmtree(extract_path)
+            if extract_path.exists(): await asyncio.to_thread(shutil.rmtree, extract_path)
+
+    @staticmethod
+    def _extract_zip(zip_path: Path, extract_path: Path):
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref: zip_ref.extractall(extract_path)
+
+    async def _fetch_zip_key_files_remote(self, download_url: str, extract_path: Path, manifest_dir: Path | None = None) -> List[str] | None:
+        """用 Range 请求只下载压缩包中的 .lua/.st 文件，并返回 .manifest 文件名列表。
+        指定 manifest_dir 时，同时下载该目录中还没有的清单。服务器不支持时返回 None，由调用方回退为完整下载。"""
+        try:
+            remote = await RemoteZip(self.client, download_url).load()
+            top_level = [name for name in remote.names() if '/' not in name and '\\' not in name]
+            manifest_names = [name for name in top_level if name.lower().endswith('.manifest')]
+            key_files = [name for name in top_level if name.lower().endswith(('.lua', '.st'))]
+            if manifest_dir is not None:
+                key_files += [name for name in manifest_names if not (manifest_dir / name).exists()]
+            extract_path.mkdir(parents=True, exist_ok=True)
+            for name in key_files:
+                await asyncio.to_thread((extract_path / name).write_bytes, await remote.read(name))
+            self.log.info(f"已按需读取远程压缩包：下载 {len(key_files)} 个文件，共 {remote.bytes_fetched} 字节。")
+            return manifest_names
+        except RemoteZipUnsupported as e:
+            self.log.info(f"无法按需读取远程压缩包 ({e})，改为完整下载。")
+        except (httpx.HTTPError, zlib.error, struct.error, UnicodeDecodeError) as e:
+            self.log.warning(f"按需读取远程压缩包失败 ({e})，改为完整下载。")
+        if extract_path.exists(): shutil.rmtree(extract_path)
+        return None
 
     async def process_zip_source(self, app_id: str, tool_type: str, unlocker_type: str, use_st_auto_update: bool, add_all_dlc: bool, patch_depot_key: bool = False) -> bool:
-        source_map = {
-            "printedwaste": "https://api.printedwaste.com/gfk/download/{app_id}",
-            "cysaw": "https://cysaw.top/uploads/{app_id}.zip",
-            "furcate": "https://furcate.eu/files/{app_id}.zip",
-            "walftech": "https://walftech.com/proxy.php?url=https%3A%2F%2Fsteamgames554.s3.us-east-1.amazonaws.com%2F{app_id}.zip",
-            "steamdatabase": "https://steamdatabase.s3.eu-north-1.amazonaws.com/{app_id}.zip",
-            "steamautocracks_v2": "special",  # 特殊处理标识
-            "buqiuren": "special",
-            "sudama": "special"
-        }
-        source_name_map = { 
-            "printedwaste": "SWA V2 (printedwaste)", 
-            "cysaw": "Cysaw", 
-            "furcate": "Furcate", 
-            "walftech": "Walftech", 
-            "steamdatabase": "SteamDatabase",
-            "steamautocracks_v2": "SteamAutoCracks/ManifestHub(2)"
-        }
-        
         # 特殊处理 steamautocracks_v2
         if tool_type == "steamautocracks_v2":
             return await self.process_steamautocracks_v2_manifest(app_id, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
@@ -2237,14 +3363,154 @@ class CaiBackend:
             if tool_type == f"custom_zip_{repo_config['name']}":
                 return await self.process_custom_zip_manifest(app_id, repo_config, add_all_dlc, patch_depot_key)
         
-        url_template = source_map.get(tool_type)
-        source_name = source_name_map.get(tool_type)
+        url_template = ZIP_SOURCE_URLS.get(tool_type)
+        source_name = ZIP_SOURCE_NAMES.get(tool_type)
         if not url_template or not source_name:
             self.log.error(f"未知的压缩包源: {tool_type}")
             return False
         download_url = url_template.format(app_id=app_id)
         return await self._process_zip_manifest_generic(app_id, download_url, source_name, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
 
+    def uses_github_api(self, tool_type: str) -> bool:
+        """该源是否需要消耗 GitHub API 请求次数（steamautocracks_v2 不是GitHub仓库）。"""
+        if tool_type == "steamautocracks_v2":
+            return False
+        return tool_type == "search" or "github" in tool_type.lower() or 'auiowu' in tool_type.lower() or 'steamautocracks' in tool_type.lower()
+
+    async def process_app(self, app_id: str, tool_type: str, unlocker_type: str, use_st_auto_update: bool, add_all_dlc: bool, patch_depot_key: bool = False) -> bool:
+        """按源类型分派到 ZIP/特殊源或 GitHub 仓库处理单个 AppID。"""
+        if tool_type == "auto":
+            return await self.process_auto_source(app_id, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
+        # 修改这里：添加steamautocracks_v2到zip_sources列表
+        zip_sources = ["printedwaste", "cysaw", "furcate", "walftech", "steamdatabase", "steamautocracks_v2", "sudama", "buqiuren"]
+        
+        # Check for custom zip sources
+        if tool_type.startswith("custom_zip_") or tool_type in zip_sources:
+            return await self.process_zip_source(app_id, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
+        return await self.process_github_manifest(app_id, tool_type, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key)
+
+    def _zip_source_urls(self, app_id: str) -> Dict[str, str]:
+        """所有 ZIP 源（内置 + 自定义）对应此 AppID 的下载地址。"""
+        urls = {tool_type: template.format(app_id=app_id) for tool_type, template in ZIP_SOURCE_URLS.items()}
+        for repo in self.get_custom_zip_repos():
+            urls[f"custom_zip_{repo['name']}"] = repo['url'].replace('{app_id}', app_id)
+        return urls
+
+    @staticmethod
+    def _total_size_from_headers(headers) -> int | None:
+        """从 Content-Range (bytes 0-0/12345) 或 Content-Length 中取得文件大小。"""
+        content_range = headers.get('content-range', '')
+        if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+            return int(content_range.rsplit('/', 1)[1])
+        length = headers.get('content-length', '')
+        return int(length) if length.isdigit() else None
+
+    async def _probe_zip_source(self, tool_type: str, url: str, use_cache: bool = True) -> Dict:
+        """只请求响应头（HEAD 不可用时改为只取首字节的 Range 请求）判断 ZIP 源是否有此 AppID，不下载压缩包。
+        state 为 available / missing / unknown：只有明确的否定响应才算 missing，网络错误、超时或其他状态码记为 unknown。"""
+        result = {"source": tool_type, "kind": "zip", "available": False, "state": "unknown", "updated_at": None, "size": None, "latency_ms": None}
+        if use_cache and SOURCE_PROBE_CACHE.is_missing(url):
+            result["cached"] = True
+            result["state"] = "missing"
+            return result
+        started = time.perf_counter()
+        missing = False
+        try:
+            response = await self.client.head(url, timeout=SOURCE_PROBE_TIMEOUT, follow_redirects=True)
+            headers = response.headers
+            if response.status_code == 200 and 'text/html' not in headers.get('content-type', ''):
+                result["available"] = True
+            elif response.status_code in (403, 405, 501):
+                # 部分源不支持 HEAD，改用 Range 请求只读取第一个字节，并校验 ZIP 文件头
+                async with self.client.stream('GET', url, headers={'Range': 'bytes=0-0'}, timeout=SOURCE_PROBE_TIMEOUT, follow_redirects=True) as response:
+                    headers = response.headers
+                    if response.status_code in (200, 206):
+                        first_chunk = b''
+                        async for chunk in response.aiter_bytes():
+                            first_chunk = chunk
+                            break
+                        result["available"] = first_chunk[:1] == b'P'
+                        missing = not result["available"]
+                    else:
+                        missing = response.status_code in (404, 410)
+            else:
+                missing = response.status_code in (200, 404, 410)
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+            if result["available"]:
+                result["state"] = "available"
+                result["size"] = self._total_size_from_headers(headers)
+                if headers.get('last-modified'):
+                    try:
+                        result["updated_at"] = parsedate_to_datetime(headers['last-modified']).timestamp()
+                    except (TypeError, ValueError):
+                        pass  # 日期格式无法解析时仍视为可用，只是更新时间未知
+            else:
+                result["state"] = "missing" if missing else "unknown"
+                result["status_code"] = response.status_code
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+            self.log.debug(f"探测 {tool_type} 失败: {e}")
+        if missing:
+            SOURCE_PROBE_CACHE.mark_missing(url)
+        return result
+
+    async def probe_zip_sources(self, app_id: str, use_cache: bool = True) -> List[Dict]:
+        """并行探测所有 ZIP 源（内置 + 自定义），返回每个源的可用性、大小与延迟，可用的排在前面。"""
+        probes = [self._probe_zip_source(tool_type, url, use_cache) for tool_type, url in self._zip_source_urls(app_id).items()]
+        results = await asyncio.gather(*probes)
+        return sorted(results, key=lambda r: (not r["available"], r["latency_ms"] or 0))
+
+    async def _probe_github_sources(self, app_id: str) -> List[Dict]:
+        if not await self.check_github_api_rate_limit():
+            self.log.warning("GitHub API 请求次数不足，自动选源将跳过 GitHub 仓库。")
+            return []
+        results = await self.search_all_repos_for_appid(app_id)
+        return [{"source": r['repo'], "kind": "github", "available": True,
+                 "updated_at": datetime.fromisoformat(r['update_date'].replace('Z', '+00:00')).timestamp()}
+                for r in results]
+
+    async def _probe_key_sources(self, app_id: str) -> List[Dict]:
+        """Sudama 与 ManifestHub(2) 共用同一份密钥数据，按 depot 密钥覆盖率评估。"""
+        coverage = 0.0
+        try:
+            depot_manifest_map = await self._get_depots_and_manifests_from_steamui(app_id)
+            keys = await self._get_cached_sudama_data() if depot_manifest_map else {}
+            if depot_manifest_map and keys:
+                hits = sum(1 for depot_id in depot_manifest_map if str(keys.get(depot_id, '')).strip())
+                coverage = hits / len(depot_manifest_map)
+        except Exception as e:
+            self.log.debug(f"探测密钥源失败: {e}")
+        return [{"source": source, "kind": "keys", "available": coverage > 0, "updated_at": None, "coverage": round(coverage, 3)}
+                for source in KEY_ONLY_SOURCES]
+
+    async def probe_sources(self, app_id: str) -> List[Dict]:
+        """并行探测所有 ZIP 源、GitHub 仓库与密钥源，按命中与更新时间排序返回。"""
+        zip_results, github_results, key_results = await asyncio.gather(
+            self.probe_zip_sources(app_id), self._probe_github_sources(app_id), self._probe_key_sources(app_id)
+        )
+        candidates = list(zip_results) + github_results + key_results
+        # 完整清单源优先，其次按更新时间从新到旧；仅密钥源按覆盖率排序
+        candidates.sort(key=lambda c: (not c["available"], c["kind"] == "keys", -(c["updated_at"] or 0), -c.get("coverage", 0)))
+        return candidates
+
+    async def process_auto_source(self, app_id: str, unlocker_type: str, use_st_auto_update: bool, add_all_dlc: bool, patch_depot_key: bool = False) -> bool:
+        """自动选源：一次并行探测后按排名依次尝试，失败时自动换下一个源。"""
+        self.log.info(f"正在并行探测所有清单源中的 AppID {app_id}...")
+        candidates = [c for c in await self.probe_sources(app_id) if c["available"]]
+        if not candidates:
+            self.log.error(f"所有清单源中都未找到 AppID {app_id}。")
+            return False
+        self.log.info(f"找到 {len(candidates)} 个可用源，按优先级: {', '.join(c['source'] for c in candidates)}")
+        for index, candidate in enumerate(candidates, 1):
+            source = candidate["source"]
+            self.log.info(f"--- 自动选源 ({index}/{len(candidates)}): 正在使用源 '{source}' ---")
+            if await self.process_app(app_id, source, unlocker_type, use_st_auto_update, add_all_dlc, patch_depot_key):
+                self.log.info(f"自动选源成功，使用的源: {source}")
+                return True
+            self.log.warning(f"源 '{source}' 处理失败，尝试下一个源。")
+        self.log.error(f"所有可用源都处理失败: AppID {app_id}")
+        return False
+
     async def fetch_branch_info(self, url: str, headers: Dict) -> Dict | None:
         try:
             r = await self.client.get(url, headers=headers)
@@ -2302,10 +3568,23 @@ class CaiBackend:
         all_files_in_tree = r2_json.get('tree', [])
         files_to_download = all_files_in_tree[:]
         
-        if unlocker_type == "steamtools" and use_st_auto_update:
+        if unlocker_type == "steamtools":
+            # SteamTools 只根据清单文件名生成 setManifestid，不需要下载清单内容
             files_to_download = [item for item in all_files_in_tree if not item['path'].endswith('.manifest')]
+        else:
+            # 增量更新：depotcache 中已有的清单（文件名包含 manifest gid）不再下载；
+            # 恢复中断的任务时，上次已写入的清单也不再下载
+            incremental = self._incremental_update_enabled()
+            depot_cache_path = self.steam_path / 'depotcache'
+            def _already_present(path: str) -> bool:
+                target = depot_cache_path / Path(path).name
+                return (incremental and target.exists()) or self._step_completed(f"manifest:{target.name}", target)
+            files_to_download = [item for item in all_files_in_tree
+                                 if not (item['path'].endswith('.manifest') and _already_present(item['path']))]
+            unchanged = len(all_files_in_tree) - len(files_to_download)
+            if unchanged: self.log.info(f"{unchanged} 个清单已存在于 depotcache，跳过下载。")
         
-        if not files_to_download and all_files_in_tree: self.log.info("没有需要下载的文件（可能是因为自动更新模式跳过了所有文件）。")
+        if not files_to_download and all_files_in_tree: self.log.info("没有需要下载的文件。")
         if not all_files_in_tree:
             self.log.warning(f"仓库 {repo} 的分支 {app_id} 为空。")
             return True
@@ -2335,6 +3614,7 @@ class CaiBackend:
             stplug_path = self.steam_path / 'config' / 'stplug-in'
             lua_filename = f"{app_id}.lua"
             lua_filepath = stplug_path / lua_filename
+            self._track_new_file(lua_filepath)
             async with aiofiles.open(lua_filepath, mode="w", encoding="utf-8") as lua_file:
                 await lua_file.write(f'addappid({app_id})\n')
                 for depot_id, info in all_depots.items():
@@ -2358,14 +3638,16 @@ class CaiBackend:
 
         else:
             self.log.info("检测到 GreenLuma/标准模式，将复制 .manifest 文件到 depotcache。")
-            if not downloaded_manifest_paths:
+            if not all_manifest_paths_in_tree:
                 self.log.error("GreenLuma 模式需要 .manifest 文件，但未能找到或下载。")
                 return False
             
             depot_cache_path = self.steam_path / 'depotcache'
             for path in downloaded_manifest_paths:
                 filename = Path(path).name
-                (depot_cache_path / filename).write_bytes(downloaded_files[path])
+                self._track_new_file(depot_cache_path / filename)
+                await asyncio.to_thread((depot_cache_path / filename).write_bytes, downloaded_files[path])
+                self._record_step(f"manifest:{filename}")
                 self.log.info(f"已为 GreenLuma 保存清单: {filename}")
             
             if all_depots:
@@ -2383,7 +3665,18 @@ class CaiBackend:
         if match: return match.group(1)
         return user_input if user_input.isdigit() else None
 
-    async def find_appid_by_name(self, game_name: str) -> List[Dict]:
+    async def find_appid_by_name(self, game_name: str, use_cache: bool = True) -> List[Dict]:
+        if use_cache:
+            cached = SEARCH_CACHE.get(game_name)
+            if cached is not None:
+                self.log.info(f"使用缓存的搜索结果: {game_name} ({len(cached)} 个)")
+                return cached
+        local_index = self.get_local_index()
+        if local_index:
+            local_results = local_index.search(game_name)
+            if local_results:
+                self.log.info(f"从本地索引找到 {len(local_results)} 个结果")
+                return local_results
         try:
             self.log.info(f"正在尝试搜索游戏: {game_name}")
             
@@ -2421,6 +3714,8 @@ class CaiBackend:
                             'header_image': image
                         })
 
+            # 空结果同样缓存，避免重复请求
+            SEARCH_CACHE.put(game_name, games_list)
             if games_list:
                 self.log.info(f"成功找到 {len(games_list)} 个结果")
                 return games_list
@@ -6,11 +6,20 @@ class CaiWebApp {
         this.taskStatus = 'idle';
         this.unlockerType = null;
         this.currentAppId = null;
+        this.currentJobId = null;
+        this.lastLogSeq = 0;
+        this.subscribedJobId = null;
         this.pollTimeout = null;
         this.stAutoUpdateContext = null; 
         this.addAllDlcContext = null;
         this.patchDepotKeyContext = null; // NEW: 添加 depotkey修补上下文
         this.isWorkshopMode = false;
+        this.clientId = Math.random().toString(36).slice(2);
+        this.typeaheadSeq = 0;
+        this.typeaheadTimer = null;
+        this.typeaheadController = null;
+        this.probeTimer = null;
+        this.probeAppId = null;
         this.initialize();
     }
 
@@ -20,6 +29,7 @@ class CaiWebApp {
             unlockForm: document.getElementById('unlockForm'),
             unlockBtn: document.getElementById('unlockBtn'),
             resetBtn: document.getElementById('resetBtn'),
+            cancelTaskBtn: document.getElementById('cancelTaskBtn'),
             restartSteamBtn: document.getElementById('restartSteamBtn'),
             appIdInput: document.getElementById('appId'),
             appIdLabel: document.getElementById('appIdLabel'),
@@ -58,9 +68,21 @@ class CaiWebApp {
 
     initializeSocket() {
         this.socket = io();
-        this.socket.on('connect', () => console.log('Connected to server.'));
+        this.socket.on('connect', () => {
+            console.log('Connected to server.');
+            // 重连后重新订阅当前任务，服务器从已收到的序号之后补发日志
+            if (this.currentJobId && this.taskStatus === 'running') this.subscribeJob(this.currentJobId);
+        });
         this.socket.on('disconnect', () => this.showSnackbar('Disconnected from server.', 'error'));
-        this.socket.on('task_progress', (data) => this.addLogEntry(data.type, data.message));
+        this.socket.on('task_progress_batch', (data) => {
+            // 服务器攒批推送日志；可同时运行多个任务，只显示本页面提交的任务日志
+            if (data.truncated) this.addLogEntry('warning', '--- 部分日志输出过快，已被丢弃 ---');
+            for (const entry of data.entries || []) {
+                if (entry.job_id && this.currentJobId && entry.job_id !== this.currentJobId) continue;
+                if (entry.job_id && entry.job_id === this.currentJobId) this.applyJobLogEntries([entry]);
+                else this.addLogEntry(entry.type, entry.message);
+            }
+        });
     }
 
     initializeEventListeners() {
@@ -71,9 +93,13 @@ class CaiWebApp {
 
         this.elements.gameSearchForm.addEventListener('submit', (e) => {
             e.preventDefault();
+            clearTimeout(this.typeaheadTimer);
             this.searchGame();
         });
 
+        this.elements.gameNameInput.addEventListener('input', () => this.scheduleTypeahead());
+        this.elements.appIdInput.addEventListener('input', () => this.scheduleSourceProbe());
+
         this.elements.gameSearchResults.addEventListener('click', (e) => {
             const previewBtn = e.target.closest('.preview-btn');
             const selectCopyBtn = e.target.closest('.select-copy-btn');
@@ -92,11 +118,13 @@ class CaiWebApp {
                     console.error('复制失败:', err);
                 });
                 this.previewGameImage(appId);
+                this.scheduleSourceProbe();
                 this.elements.appIdInput.focus();
             }
         });
         
         this.elements.restartSteamBtn.addEventListener('click', () => this.restartSteam());
+        this.elements.cancelTaskBtn.addEventListener('click', () => this.cancelTask());
         this.elements.resetBtn.addEventListener('click', () => this.resetForm());
         this.elements.clearLogBtn.addEventListener('click', () => this.clearLogs());
         this.elements.snackbarClose.addEventListener('click', () => this.hideSnackbar());
@@ -271,6 +299,7 @@ class CaiWebApp {
             // 回退到硬编码的内置源
             const fallbackSources = {
                 "自动搜索GitHub": "search",
+                "自动选择最佳源": "auto",
                 "SWA V2": "printedwaste",
                 "Cysaw": "cysaw",
                 "Furcate": "furcate",
@@ -314,6 +343,81 @@ class CaiWebApp {
         }
     }
 
+    // 输入 AppID 后探测各 ZIP 源是否收录该游戏，隐藏没有此游戏的源
+    scheduleSourceProbe() {
+        clearTimeout(this.probeTimer);
+        if (this.isWorkshopMode) return;
+        const value = this.elements.appIdInput.value.trim();
+        const match = value.match(/(?:\/app\/|\b)(\d+)\b/);
+        const appId = match ? match[1] : null;
+        if (!appId) { this.probeAppId = null; this.applySourceProbe(null); return; }
+        this.probeTimer = setTimeout(() => this.probeSources(appId), 600);
+    }
+
+    async probeSources(appId) {
+        this.probeAppId = appId;
+        try {
+            const response = await fetch(`/api/sources/probe?app_id=${encodeURIComponent(appId)}`);
+            const data = await response.json();
+            if (this.probeAppId !== appId) return; // 期间输入已改变
+            this.applySourceProbe(data.success ? data.sources : null);
+        } catch (error) {
+            console.error('探测清单源失败:', error);
+        }
+    }
+
+    applySourceProbe(sources) {
+        const probeMap = new Map((sources || []).map(source => [source.source, source]));
+        const items = this.elements.toolTypeGroup.querySelectorAll('.radio-item');
+        items.forEach(item => {
+            const input = item.querySelector('input[name="toolType"]');
+            const probe = input ? probeMap.get(input.value) : null;
+            item.querySelector('.source-probe-hint')?.remove();
+            // 只隐藏明确没有此游戏的源；网络错误或超时的源状态未知，仍可选择
+            item.style.display = probe?.state === 'missing' ? 'none' : '';
+            if (probe?.available) {
+                const parts = [];
+                if (probe.size) parts.push(`${(probe.size / 1024 / 1024).toFixed(1)} MB`);
+                if (probe.latency_ms !== null) parts.push(`${probe.latency_ms} ms`);
+                item.insertAdjacentHTML('beforeend', `<span class="source-probe-hint">${parts.join(' · ') || '可用'}</span>`);
+            } else if (probe?.state === 'unknown') {
+                item.insertAdjacentHTML('beforeend', '<span class="source-probe-hint">状态未知</span>');
+            }
+            if (input?.checked && item.style.display === 'none') input.checked = false;
+        });
+        if (!this.elements.toolTypeGroup.querySelector('input[name="toolType"]:checked')) {
+            const firstVisible = Array.from(items).find(item => item.style.display !== 'none');
+            const input = firstVisible?.querySelector('input[name="toolType"]');
+            if (input) input.checked = true;
+        }
+    }
+
+    // 输入联想: 前端去抖 + 取消过期请求，后端同样会丢弃过期查询
+    scheduleTypeahead(delay = 300) {
+        clearTimeout(this.typeaheadTimer);
+        const query = this.elements.gameNameInput.value.trim();
+        if (query.length < 2) return;
+        this.typeaheadTimer = setTimeout(() => this.runTypeahead(query), delay);
+    }
+
+    async runTypeahead(query) {
+        if (this.typeaheadController) this.typeaheadController.abort();
+        this.typeaheadController = new AbortController();
+        const seq = ++this.typeaheadSeq;
+        const params = new URLSearchParams({ q: query, client_id: this.clientId, seq });
+        try {
+            const response = await fetch(`/api/search_game/typeahead?${params}`, { signal: this.typeaheadController.signal });
+            const data = await response.json();
+            if (data.stale || seq !== this.typeaheadSeq || query !== this.elements.gameNameInput.value.trim()) return;
+            if (!data.success) return;
+            this.displayGameResults(data.games);
+            // 前缀结果只是临时答案，稍后再查一次以获取完整结果
+            if (data.partial) this.scheduleTypeahead(800);
+        } catch (error) {
+            if (error.name !== 'AbortError') console.error('Typeahead error:', error);
+        }
+    }
+
     displayGameResults(games) {
         if (!games || games.length === 0) { this.elements.gameSearchResults.innerHTML = `<div class="status-item warning">未找到相关游戏。</div>`; return; }
         let html = games.map(game => ` <div class="search-result-item"> <div class="search-result-info"> <span class="name">${game.name}</span> <span class="appid">AppID: ${game.appid}</span> </div> <button class="preview-btn" data-appid="${game.appid}" title="预览图片"> <span class="material-icons">image</span> </button> <button class="select-copy-btn" data-appid="${game.appid}" title="选择并复制 AppID"> <span class="material-icons">content_copy</span> </button> </div> `).join('');
@@ -400,6 +504,8 @@ class CaiWebApp {
             });
             const data = await response.json();
             if (data.success) {
+                this.currentJobId = data.job_id;
+                this.lastLogSeq = 0;
                 this.showSnackbar('创意工坊任务已开始。', 'info');
                 this.startStatusPolling();
             } else { 
@@ -463,6 +569,8 @@ class CaiWebApp {
             });
             const data = await response.json();
             if (data.success) {
+                this.currentJobId = data.job_id;
+                this.lastLogSeq = 0;
                 this.showSnackbar('任务已开始。', 'info');
                 this.startStatusPolling();
             } else { throw new Error(data.message); }
@@ -474,17 +582,43 @@ class CaiWebApp {
         }
     }
 
+    subscribeJob(jobId) {
+        // 任务日志只推送到以任务ID命名的房间
+        if (this.subscribedJobId && this.subscribedJobId !== jobId) this.socket.emit('unsubscribe_job', { job_id: this.subscribedJobId });
+        this.subscribedJobId = jobId;
+        this.socket.emit('subscribe_job', { job_id: jobId, since: this.lastLogSeq });
+    }
+
+    applyJobLogEntries(entries) {
+        // 日志同时来自 Socket.IO 推送与状态轮询，按序号去重
+        for (const entry of entries) {
+            if (entry.seq <= this.lastLogSeq) continue;
+            this.addLogEntry(entry.type, entry.message);
+            this.lastLogSeq = entry.seq;
+        }
+    }
+
     startStatusPolling() {
+        // 长轮询：带上已收到的日志序号，服务器只返回更新的日志，有新日志或任务结束时立即返回
         const maxPollDuration = 300000;
         let pollStartTime = Date.now();
-        const pollInterval = setInterval(async () => {
+        const jobId = this.currentJobId;
+        this.subscribeJob(jobId);
+        let stopped = false;
+        const stopPolling = () => { stopped = true; };
+        const poll = async () => {
+            if (stopped || jobId !== this.currentJobId) return;
             try {
-                const response = await fetch('/api/task_status', { timeout: 10000 });
+                const response = await fetch(`/api/task_status?job_id=${jobId}&since=${this.lastLogSeq}&wait=20`);
                 const data = await response.json();
-                if (data.status === 'completed' || data.status === 'error') {
-                    clearInterval(pollInterval);
+                if (stopped) return;
+                if (data.truncated) this.addLogEntry('warning', '--- 部分日志输出过快，已被丢弃 ---');
+                this.applyJobLogEntries(data.progress || []);
+                if (['completed', 'error', 'cancelled', 'timeout'].includes(data.status)) {
+                    stopPolling();
                     clearTimeout(this.pollTimeout);
                     this.taskStatus = 'idle';
+                    this.elements.cancelTaskBtn.style.display = 'none';
                     if (data.result?.action_required === 'select_source') { this.handleSourceSelection(data.result); } 
                     else { 
                         this.stAutoUpdateContext = null; 
@@ -496,25 +630,43 @@ class CaiWebApp {
                     this.addLogEntry(data.result?.success ? 'info' : 'error', `--- 任务结束 ---`);
                 }
                 if (Date.now() - pollStartTime > maxPollDuration) {
-                    clearInterval(pollInterval); clearTimeout(this.pollTimeout); this.taskStatus = 'idle'; this.setFormDisabled(false);
+                    stopPolling(); clearTimeout(this.pollTimeout); this.taskStatus = 'idle'; this.setFormDisabled(false);
                     this.stAutoUpdateContext = null; this.addAllDlcContext = null; this.patchDepotKeyContext = null; // NEW: 清空上下文
                     this.showSnackbar('任务超时，请检查网络或重试。', 'error'); this.addLogEntry('error', '任务超时，可能由于网络问题或服务器无响应。');
                 }
             } catch (error) {
                 console.error('Status polling error:', error);
-                clearInterval(pollInterval); clearTimeout(this.pollTimeout); this.taskStatus = 'idle'; this.setFormDisabled(false);
+                stopPolling(); clearTimeout(this.pollTimeout); this.taskStatus = 'idle'; this.setFormDisabled(false);
                 this.stAutoUpdateContext = null; this.addAllDlcContext = null; this.patchDepotKeyContext = null; // NEW: 清空上下文
                 this.showSnackbar(`轮询状态失败: ${error.message}`, 'error'); this.addLogEntry('error', `轮询状态失败: ${error.message}`);
+                return;
             }
-        }, 1500);
+            if (!stopped) setTimeout(poll, 250);
+        };
+        poll();
 
         this.pollTimeout = setTimeout(() => {
-            clearInterval(pollInterval); this.taskStatus = 'idle'; this.setFormDisabled(false);
+            stopPolling(); this.taskStatus = 'idle'; this.setFormDisabled(false);
             this.stAutoUpdateContext = null; this.addAllDlcContext = null; this.patchDepotKeyContext = null; // NEW: 清空上下文
             this.showSnackbar('任务超时，请检查网络或重试。', 'error'); this.addLogEntry('error', '任务超时，可能由于网络问题或服务器无响应。');
         }, maxPollDuration);
     }
 
+    async cancelTask() {
+        if (!this.currentJobId) return;
+        this.elements.cancelTaskBtn.disabled = true;
+        try {
+            const response = await fetch(`/api/task/${this.currentJobId}/cancel`, { method: 'POST' });
+            const data = await response.json();
+            this.showSnackbar(data.message, data.success ? 'info' : 'warning');
+            if (data.success) this.addLogEntry('warning', '--- 已请求取消任务 ---');
+        } catch (error) {
+            this.showSnackbar(`取消任务失败: ${error.message}`, 'error');
+        } finally {
+            this.elements.cancelTaskBtn.disabled = false;
+        }
+    }
+
     handleSourceSelection(result) {
         const sources = result.sources;
         this.stAutoUpdateContext = result.context?.use_st_auto_update ?? false;
@@ -551,6 +703,7 @@ class CaiWebApp {
         this.elements.unlockBtn.disabled = disabled;
         this.elements.resetBtn.disabled = disabled;
         this.elements.appIdInput.disabled = disabled;
+        this.elements.cancelTaskBtn.style.display = disabled && this.taskStatus === 'running' ? '' : 'none';
         
         const allRadios = this.elements.unlockForm.querySelectorAll('input[type="radio"]');
         allRadios.forEach(radio => radio.disabled = disabled);
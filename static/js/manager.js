@@ -6,6 +6,8 @@ class FileManagerApp {
             noResultsMessage: document.getElementById('noResultsMessage'),
             tabButtons: document.querySelectorAll('.tab-button'),
             searchInput: document.getElementById('searchInput'),
+            sortSelect: document.getElementById('sortSelect'),
+            scrollContainer: document.querySelector('.grid-view-container'),
             refreshBtn: document.getElementById('refreshBtn'),
             deleteBtn: document.getElementById('deleteBtn'),
             selectAllCheckbox: document.getElementById('selectAllCheckbox'),
@@ -24,17 +26,66 @@ class FileManagerApp {
             saveEditorBtn: document.getElementById('saveEditorBtn'),
             editorStatus: document.getElementById('editorStatus'),
         };
-        this.fullData = {};
+        // 列表由后端分页返回，滚动到底部附近时再加载下一页
+        this.items = [];
+        this.total = 0;
+        this.hasMore = false;
+        this.pageSize = 120;
+        this.pageRequest = 0;
+        this.loadingPage = false;
         this.currentTab = 'st';
         this.currentItemForEditor = null;
+        this.socket = null;
         this.initialize();
     }
 
+    initializeSocket() {
+        if (typeof io === 'undefined') return;
+        this.socket = io();
+        // 游戏名称由后端逐个解析后推送，收到后直接就地更新卡片
+        this.socket.on('manager_game_name', (data) => this.applyGameName(data.appid, data.name));
+        this.socket.on('manager_names_done', () => {
+            this.elements.gridContainer.querySelectorAll('.game-title.pending').forEach(el => el.classList.remove('pending'));
+        });
+        // 后端监视入库目录，文件被其他工具修改时推送变化，这里静默刷新列表
+        this.socket.on('connect', () => this.socket.emit('subscribe_library'));
+        this.socket.on('library_changes', (data) => this.scheduleLibrarySync(data.changes || []));
+    }
+
+    scheduleLibrarySync(changes) {
+        this.pendingLibraryChanges = (this.pendingLibraryChanges || 0) + changes.length;
+        clearTimeout(this.librarySyncTimer);
+        this.librarySyncTimer = setTimeout(async () => {
+            const count = this.pendingLibraryChanges;
+            this.pendingLibraryChanges = 0;
+            await this.fetchFiles(true);
+            this.elements.statusText.textContent = `检测到 ${count} 处文件变化，列表已同步。`;
+        }, 500);
+    }
+
+    applyGameName(appid, name) {
+        this.items.forEach(item => { if (item.appid === appid) item.game_name = name; });
+        this.elements.gridContainer.querySelectorAll(`.game-card[data-appid="${appid}"]`).forEach(card => {
+            const item = JSON.parse(card.dataset.item);
+            item.game_name = name;
+            card.dataset.item = JSON.stringify(item);
+            const title = card.querySelector('.game-title');
+            if (title) {
+                title.textContent = name;
+                title.title = name;
+                title.classList.remove('pending');
+            }
+        });
+    }
+
     initialize() {
+        this.initializeSocket();
         this.elements.tabButtons.forEach(btn => btn.addEventListener('click', () => this.switchTab(btn.dataset.tab)));
         this.elements.refreshBtn.addEventListener('click', () => this.fetchFiles());
         this.elements.deleteBtn.addEventListener('click', () => this.deleteSelected());
         this.elements.searchInput.addEventListener('input', () => this.filterGrid());
+        this.elements.sortSelect.addEventListener('change', () => this.reloadList());
+        this.elements.scrollContainer.addEventListener('scroll', () => this.maybeLoadMore());
         this.elements.selectAllCheckbox.addEventListener('change', () => this.toggleSelectAll());
         this.elements.gridContainer.addEventListener('change', e => e.target.classList.contains('card-checkbox') && this.updateSelectionState());
         this.elements.shutdownBtn.addEventListener('click', this.shutdown);
@@ -49,6 +100,7 @@ class FileManagerApp {
         document.getElementById('forceUnlockRemove').addEventListener('click', () => this.handleForceUnlock('remove'));
         document.getElementById('openStFolder').addEventListener('click', () => this.openFolder('st'));
         document.getElementById('openGlFolder').addEventListener('click', () => this.openFolder('gl'));
+        document.getElementById('depotcacheGc').addEventListener('click', () => this.collectDepotcacheGarbage());
 
         // Context Menu
         this.elements.gridContainer.addEventListener('contextmenu', e => this.showContextMenu(e));
@@ -75,20 +127,15 @@ class FileManagerApp {
         this.elements.loadingOverlay.classList.toggle('visible', isLoading);
     }
 
-    async fetchFiles() {
-        this.setLoading(true);
-        this.elements.statusText.textContent = '正在从服务器获取文件列表...';
+    async fetchFiles(silent = false) {
+        // 要求后端重新扫描目录并加载第一页；只在打开页面、手动刷新、删除后和目录变化推送时调用
+        if (!silent) {
+            this.setLoading(true);
+            this.elements.statusText.textContent = '正在从服务器获取文件列表...';
+        }
         try {
-            const response = await fetch('/api/manager/files');
-            if (!response.ok) throw new Error(`服务器响应错误: ${response.status}`);
-            const result = await response.json();
-            if (result.success) {
-                this.fullData = result.data;
-                this.renderGrid();
-                this.showSnackbar('文件列表已刷新', 'success');
-            } else {
-                throw new Error(result.message || '获取文件失败');
-            }
+            await this.loadPage(true, true);
+            if (!silent) this.showSnackbar('文件列表已刷新', 'success');
         } catch (error) {
             this.showSnackbar(error.message, 'error');
             this.elements.statusText.textContent = `错误: ${error.message}`;
@@ -97,36 +144,80 @@ class FileManagerApp {
         }
     }
 
+    reloadList() {
+        // 搜索、排序、切换标签只重新查询后端的内存列表，不触发重新扫描
+        this.loadPage(true).catch(error => this.showSnackbar(error.message, 'error'));
+    }
+
+    async loadPage(reset = false, refresh = false) {
+        if (!reset && (this.loadingPage || !this.hasMore)) return;
+        const requestId = ++this.pageRequest;
+        this.loadingPage = true;
+        const [sort, order] = this.elements.sortSelect.value.split(':');
+        const params = new URLSearchParams({
+            tab: this.currentTab,
+            offset: reset ? 0 : this.items.length,
+            limit: this.pageSize,
+            sort, order,
+            q: this.elements.searchInput.value.trim()
+        });
+        if (refresh) params.set('refresh', '1');
+        if (!reset && this.listingVersion !== undefined) params.set('version', this.listingVersion);
+        try {
+            const response = await fetch(`/api/manager/files?${params}`);
+            if (!response.ok) throw new Error(`服务器响应错误: ${response.status}`);
+            const result = await response.json();
+            if (!result.success) throw new Error(result.message || '获取文件失败');
+            // 切换标签、排序或搜索后，较早发出的请求结果直接丢弃
+            if (requestId !== this.pageRequest) return;
+            if (result.stale) {
+                // 列表已被其他页面或文件变化重建，继续翻页会错位，从第一页重新加载
+                this.elements.statusText.textContent = '文件列表已更新，已重新加载。';
+                return await this.loadPage(true);
+            }
+            this.listingVersion = result.version;
+            if (reset) {
+                this.items = [];
+                this.elements.scrollContainer.scrollTop = 0;
+            }
+            this.items = this.items.concat(result.items);
+            this.total = result.total;
+            this.hasMore = result.has_more;
+            this.renderGrid(result.items, !reset);
+        } finally {
+            if (requestId === this.pageRequest) this.loadingPage = false;
+        }
+        // 第一页不足以填满可视区域时继续加载，否则不会触发滚动事件
+        this.maybeLoadMore();
+    }
+
+    maybeLoadMore() {
+        const container = this.elements.scrollContainer;
+        if (container.scrollTop + container.clientHeight < container.scrollHeight - 600) return;
+        this.loadPage().catch(error => this.showSnackbar(error.message, 'error'));
+    }
+
     switchTab(tab) {
         this.currentTab = tab;
         this.elements.tabButtons.forEach(btn => btn.classList.toggle('active', btn.dataset.tab === tab));
-        this.renderGrid();
+        this.reloadList();
     }
 
-    renderGrid() {
-        const data = this.fullData[this.currentTab] || [];
-        const searchTerm = this.elements.searchInput.value.toLowerCase();
-        
+    renderGrid(data = this.items, append = false) {
         const statusMap = {
             ok: { text: '已入库', class: 'ok' },
             unlocked_only: { text: '仅解锁', class: 'unlocked_only' },
             core_file: { text: '核心文件', class: 'core_file' }
         };
 
-        const filteredData = data.filter(item => 
-            (item.filename?.toLowerCase() || '').includes(searchTerm) ||
-            (item.appid?.toLowerCase() || '').includes(searchTerm) ||
-            (item.game_name?.toLowerCase() || '').includes(searchTerm)
-        );
-
-        if (filteredData.length === 0) {
-            const message = data.length === 0 ? '此类别下没有文件。' : '没有匹配搜索结果。';
+        if (this.items.length === 0) {
+            const message = this.elements.searchInput.value.trim() ? '没有匹配搜索结果。' : '此类别下没有文件。';
             this.elements.noResultsMessage.textContent = message;
             this.elements.noResultsMessage.style.display = 'block';
             this.elements.gridContainer.innerHTML = '';
         } else {
             this.elements.noResultsMessage.style.display = 'none';
-            const html = filteredData.map(item => {
+            const html = data.map(item => {
                 const statusInfo = statusMap[item.status] || { text: '未知', class: '' };
                 const isCoreFile = item.status === 'core_file';
                 const hasValidAppID = item.appid && /^\d+$/.test(item.appid);
@@ -137,14 +228,14 @@ class FileManagerApp {
                     : `<div class="placeholder"><span class="material-icons">image</span></div>`;
 
                 return `
-                    <div class="game-card" data-item='${JSON.stringify(item)}'>
+                    <div class="game-card" data-appid="${item.appid}" data-item='${JSON.stringify(item)}'>
                         <input type="checkbox" class="card-checkbox" ${isCoreFile ? 'disabled' : ''} title="选择此项">
                         <div class="game-card-header" ${hasValidAppID ? `onclick="window.open('steam://run/${item.appid}')"` : ''} title="启动/安装游戏">
                             ${imageHtml}
                         </div>
                         <div class="game-card-body">
                             <span class="status-badge ${statusInfo.class}">${statusInfo.text}</span>
-                            <span class="game-title" title="${item.game_name || 'N/A'}">${item.game_name || 'N/A'}</span>
+                            <span class="game-title ${item.game_name === '加载中...' ? 'pending' : ''}" title="${item.game_name || 'N/A'}">${item.game_name || 'N/A'}</span>
                             <span class="game-appid">APPID: ${item.appid || 'N/A'}</span>
                             <div class="game-card-actions">
                                 <button class="btn btn-icon context-menu-trigger" title="更多操作">
@@ -155,10 +246,12 @@ class FileManagerApp {
                     </div>
                 `;
             }).join('');
-            this.elements.gridContainer.innerHTML = html;
+            if (!append) this.elements.gridContainer.innerHTML = '';
+            this.elements.gridContainer.insertAdjacentHTML('beforeend', html);
             
             // Add event listeners for the 'more' button to trigger context menu
-            this.elements.gridContainer.querySelectorAll('.context-menu-trigger').forEach(btn => {
+            this.elements.gridContainer.querySelectorAll('.context-menu-trigger:not([data-bound])').forEach(btn => {
+                btn.dataset.bound = '1';
                 btn.addEventListener('click', e => {
                     e.stopPropagation(); // Prevent card click event
                     const card = e.target.closest('.game-card');
@@ -175,7 +268,11 @@ class FileManagerApp {
     }
 
 
-    filterGrid() { this.renderGrid(); }
+    filterGrid() {
+        // 搜索在后端完成，输入停顿后重新请求第一页
+        clearTimeout(this.searchTimer);
+        this.searchTimer = setTimeout(() => this.reloadList(), 250);
+    }
     
     toggleSelectAll() {
         const isChecked = this.elements.selectAllCheckbox.checked;
@@ -204,7 +301,7 @@ class FileManagerApp {
         }
         
         this.elements.selectAllCheckbox.checked = allCheckboxes.length > 0 && checkedCheckboxes.length === allCheckboxes.length;
-        this.elements.statusText.textContent = `选中 ${checkedCheckboxes.length} / ${allCheckboxes.length} 项`;
+        this.elements.statusText.textContent = `选中 ${checkedCheckboxes.length} / ${allCheckboxes.length} 项（已加载 ${this.items.length} / ${this.total} 条）`;
     }
 
     async deleteSelected(items = null) {
@@ -250,6 +347,27 @@ class FileManagerApp {
         } catch (error) { this.showSnackbar(`打开目录失败: ${error.message}`, 'error'); }
     }
 
+    async collectDepotcacheGarbage() {
+        // 先试运行统计，确认后再真正删除
+        const request = (dryRun) => fetch('/api/manager/depotcache_gc', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ dry_run: dryRun })
+        }).then(response => response.json());
+        try {
+            const report = await request(true);
+            if (!report.success) throw new Error(report.message);
+            if (report.orphan_count === 0) {
+                this.showSnackbar('没有需要清理的清单文件。', 'info');
+                return;
+            }
+            const mb = (report.orphan_bytes / 1024 / 1024).toFixed(1);
+            if (!confirm(`发现 ${report.orphan_count} 个不再被任何入库文件引用的清单，共 ${mb} MB。\n确定要删除吗？`)) return;
+            const result = await request(false);
+            this.showSnackbar(result.message, result.success ? 'success' : 'error');
+        } catch (error) { this.showSnackbar(`清理清单失败: ${error.message}`, 'error'); }
+    }
+
     async handleForceUnlock(action) {
         const promptText = action === 'add' ? '请输入要强制解锁的AppID:' : '请输入要移除解锁的AppID:';
         const appid = prompt(promptText);
@@ -40,6 +40,10 @@ class SettingsManager {
             downloadUpdateBtn: document.getElementById('downloadUpdateBtn'),
             laterUpdateBtn: document.getElementById('laterUpdateBtn'),
             ignoreUpdateBtn: document.getElementById('ignoreUpdateBtn'),
+            // 本地游戏索引
+            importAppIndexBtn: document.getElementById('importAppIndexBtn'),
+            appIndexInput: document.getElementById('appIndexInput'),
+            appIndexStatus: document.getElementById('appIndexStatus'),
         };
         
         this.currentRepoType = 'github'; // 'github' or 'zip'
@@ -64,6 +68,11 @@ class SettingsManager {
         this.elements.checkUpdatesBtn.addEventListener('click', () => this.checkForUpdates());
         this.elements.addGithubRepoBtn.addEventListener('click', () => this.showAddRepoModal('github'));
         this.elements.addZipRepoBtn.addEventListener('click', () => this.showAddRepoModal('zip'));
+
+        // 本地游戏索引
+        this.elements.importAppIndexBtn.addEventListener('click', () => this.elements.appIndexInput.click());
+        this.elements.appIndexInput.addEventListener('change', (e) => this.importAppIndex(e.target.files[0]));
+        this.loadAppIndexStatus();
         
         // 模态框事件监听器
         this.elements.saveRepoBtn.addEventListener('click', () => this.saveRepo());
@@ -460,6 +469,36 @@ class SettingsManager {
         }
     }
     
+    async loadAppIndexStatus() {
+        const statusText = this.elements.appIndexStatus.querySelector('.status-text');
+        try {
+            const response = await fetch('/api/app_index/status');
+            const data = await response.json();
+            statusText.textContent = data.available
+                ? `已导入本地索引，共 ${data.app_count} 个应用 (${(data.size / 1024 / 1024).toFixed(1)} MB)`
+                : '尚未导入本地索引，将使用在线接口。';
+        } catch (error) {
+            statusText.textContent = `检查本地索引失败: ${error.message}`;
+        }
+    }
+
+    async importAppIndex(file) {
+        if (!file) return;
+        const formData = new FormData();
+        formData.append('appListFile', file);
+        this.showSnackbar('正在建立本地游戏索引...', 'info');
+        try {
+            const response = await fetch('/api/app_index/import', { method: 'POST', body: formData });
+            const data = await response.json();
+            this.showSnackbar(data.message, data.success ? 'success' : 'error');
+        } catch (error) {
+            this.showSnackbar(`导入失败: ${error.message}`, 'error');
+        } finally {
+            this.elements.appIndexInput.value = '';
+            this.loadAppIndexStatus();
+        }
+    }
+
     showSnackbar(message, type = 'info') {
         this.elements.snackbarMessage.textContent = message;
         this.elements.snackbar.className = `snackbar ${type} show`;
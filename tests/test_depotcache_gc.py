@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import backend
+from backend import CaiBackend
+
+
+class DepotcacheGarbageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        backend._WRITTEN_MANIFESTS = None
+        self.backend = CaiBackend()
+        self.backend.project_root = root
+        self.backend.steam_path = root / 'Steam'
+        self.st_dir = self.backend.steam_path / 'config' / 'stplug-in'
+        self.depotcache = self.backend.steam_path / 'depotcache'
+        self.workshop_depotcache = self.backend.steam_path / 'config' / 'depotcache'
+        for directory in (self.st_dir, self.depotcache, self.workshop_depotcache):
+            directory.mkdir(parents=True)
+
+    def tearDown(self):
+        backend._WRITTEN_MANIFESTS = None
+        self.tmp.cleanup()
+
+    def _manifest(self, directory: Path, name: str, written_by_tool: bool = True) -> Path:
+        path = directory / name
+        if written_by_tool:
+            self.backend._track_new_file(path)
+        path.write_bytes(b'manifest')
+        old = time.time() - 48 * 3600
+        os.utime(path, (old, old))
+        return path
+
+    def test_workshop_manifests_of_unlocked_apps_are_kept(self):
+        (self.st_dir / '570.lua').write_text('addappid(570)\naddappid(571, 1, "abcdef")\n', encoding='utf-8')
+        workshop = self._manifest(self.depotcache, '570_999.manifest')
+        workshop_config = self._manifest(self.workshop_depotcache, '570_999.manifest')
+        keyed = self._manifest(self.depotcache, '571_111.manifest')
+        orphan = self._manifest(self.depotcache, '572_222.manifest')
+
+        report = self.backend.collect_depotcache_garbage(dry_run=True)
+        self.assertEqual([item["filename"] for item in report["orphans"]], ['572_222.manifest'])
+
+        self.backend.collect_depotcache_garbage(dry_run=False)
+        self.assertTrue(workshop.exists())
+        self.assertTrue(workshop_config.exists())
+        self.assertTrue(keyed.exists())
+        self.assertFalse(orphan.exists())
+
+    def test_manifests_not_written_by_tool_are_kept(self):
+        steam_owned = self._manifest(self.depotcache, '730_333.manifest', written_by_tool=False)
+
+        report = self.backend.collect_depotcache_garbage(dry_run=False)
+        self.assertEqual(report["orphan_count"], 0)
+        self.assertTrue(steam_owned.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()